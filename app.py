@@ -93,6 +93,8 @@ if 'state_manager' not in st.session_state:
 
 if 'mcp_server' not in st.session_state:
     st.session_state.mcp_server = MCPServer(st.session_state.state_manager)
+    # Load the RAG model/index in the background so the first health question doesn't stall
+    st.session_state.mcp_server.warm_up_rag_retriever()
 
 if 'mcp_router' not in st.session_state:
     st.session_state.mcp_router = MCPRouter(st.session_state.mcp_server)
@@ -1916,16 +1918,15 @@ with col2:
         MAX_CHAT_HISTORY = 50
         if len(st.session_state.chat_history) > MAX_CHAT_HISTORY:
             # Keep last 50 messages, move older ones for summarization
-            messages_to_summarize = st.session_state.chat_history[:-50]
-            st.session_state.chat_history = st.session_state.chat_history[-50:]
+            # (trim in place so the bounded list is reused instead of copied every overflow)
+            messages_to_summarize = st.session_state.chat_history[:-MAX_CHAT_HISTORY]
+            del st.session_state.chat_history[:-MAX_CHAT_HISTORY]
             
             # Trigger summarization in background if we have messages to summarize (Phase 3.1: Background Summarization)
             if messages_to_summarize and st.session_state.turn_count - st.session_state.conversation_summary["last_summarized_turn"] >= 10:
                 print(f"[CONTEXT] Triggering background summarization: {len(messages_to_summarize)} messages, turn {st.session_state.turn_count}")
                 # Start summarization in background thread (don't block)
-                executor = ThreadPoolExecutor(max_workers=1)
-                future = executor.submit(
-                    st.session_state.llm_client.summarize_conversation,
+                future = st.session_state.llm_client.summarize_conversation_async(
                     messages_to_summarize,
                     st.session_state.conversation_summary
                 )
@@ -1941,9 +1942,7 @@ with col2:
                     messages_to_summarize = st.session_state.chat_history[:-5]
                     print(f"[CONTEXT] Triggering background summarization: {len(messages_to_summarize)} messages, ~{estimated_tokens} tokens")
                     # Start summarization in background thread (don't block)
-                    executor = ThreadPoolExecutor(max_workers=1)
-                    future = executor.submit(
-                        st.session_state.llm_client.summarize_conversation,
+                    future = st.session_state.llm_client.summarize_conversation_async(
                         messages_to_summarize,
                         st.session_state.conversation_summary
                     )
@@ -1962,7 +1961,7 @@ with col2:
                         # If we trimmed history, keep only last 5 messages after summarization
                         estimated_tokens_check = len(st.session_state.chat_history) * 80
                         if estimated_tokens_check > 2000 and len(st.session_state.chat_history) > 5:
-                            st.session_state.chat_history = st.session_state.chat_history[-5:]
+                            del st.session_state.chat_history[:-5]
                 except Exception as e:
                     print(f"[CONTEXT ERROR] Background summarization failed: {e}")
                 finally:
@@ -30,6 +30,12 @@ DEFAULT_USER_LOCATION = "Bedroom"
 
 # Feature flags for optimizations
 USE_COMPACT_PROMPT = os.getenv("USE_COMPACT_PROMPT", "false").lower() == "true"
+# Re-read today's schedule after each schedule_modifier write and log whether it was applied (debugging aid)
+VERIFY_SCHEDULE_WRITES = os.getenv("VERIFY_SCHEDULE_WRITES", "false").lower() == "true"
+# Run the RAG query encoder through ONNX Runtime with an int8-quantized model when no GPU is present
+# (needs optimum[onnxruntime]; falls back to the PyTorch encoder if unavailable)
+RAG_ONNX_ENCODER = os.getenv("RAG_ONNX_ENCODER", "false").lower() == "true"
+RAG_ONNX_MODEL_FILE = os.getenv("RAG_ONNX_MODEL_FILE", "onnx/model_quint8_avx2.onnx")
 
 # Database configuration
 # Use absolute path based on project root for reliability
@@ -3,10 +3,75 @@ State management for devices, user location, and reminders.
 Uses database for persistence.
 """
 
+from functools import wraps
+from time import monotonic
+
 from config import ROOMS, DEFAULT_USER_LOCATION
 from core.activity_derivation import ActivityDerivationService
 from database.manager import DatabaseManager
 
+# Longest time (seconds) a revision-keyed cache may serve stored state. The revision only counts
+# changes made through this StateManager; other sessions writing the shared database don't bump it.
+STATE_CACHE_TTL = 0.5
+
+
+def _bumps_revision(method):
+    """
+    Decorator for StateManager methods that modify state: increments the state revision.
+    
+    The revision lets consumers (e.g. the LLM state-formatting cache) detect that state
+    is unchanged without serializing it.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._revision += 1
+    return wrapper
+
+
+def time_to_minutes(time_str: str) -> int:
+    """
+    Convert an "HH:MM" time string to minutes since midnight.
+    
+    Args:
+        time_str: Time string in HH:MM format
+        
+    Returns:
+        Minutes since midnight, or -1 if the string cannot be parsed
+    """
+    try:
+        hours, minutes = time_str.strip().split(":")
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return -1
+
+
+def render_user_info_block(user_info: dict) -> str:
+    """
+    Render the "USER INFORMATION:" block (name and condition) used in the LLM state prompt.
+    
+    Args:
+        user_info: Dict with "name" ({"thai": str, "english": str}) and "condition" keys
+        
+    Returns:
+        Block text without a trailing newline
+    """
+    lines = ["USER INFORMATION:"]
+    name = user_info.get("name") or {}
+    name_parts = []
+    if name.get("thai"):
+        name_parts.append(f"Thai: {name['thai']}")
+    if name.get("english"):
+        name_parts.append(f"English: {name['english']}")
+    if name_parts:
+        lines.append(f"  Name: {', '.join(name_parts)}")
+    condition = user_info.get("condition", "")
+    if condition:
+        lines.append(f"  Condition: {condition}")
+    return "\n".join(lines)
+
 
 def _validate_schedule_item(item: dict) -> tuple[bool, str]:
     """
@@ -142,6 +207,7 @@ class StateManager:
             self.db_manager = db_manager
         
         self._activity_derivation = ActivityDerivationService()  # Activity derivation service
+        self._revision = 0  # Incremented by every state-modifying method (see _bumps_revision)
         
         # Initialize devices in database if not exist
         self.db_manager.initialize_devices(ROOMS)
@@ -172,6 +238,28 @@ class StateManager:
             ]
             self.db_manager.set_schedule_items(default_schedule)
     
+    @property
+    def revision(self) -> int:
+        """State revision counter - changes whenever state is modified through this manager."""
+        return self._revision
+    
+    def batch(self):
+        """
+        Group several state reads/writes into one database transaction.
+        
+        Usage:
+            with state_manager.batch():
+                ...
+        
+        Returns:
+            Context manager (see DatabaseManager.batch)
+        """
+        return self.db_manager.batch()
+    
+    def rollback_batch(self) -> None:
+        """Discard the writes made so far in the current batch() block (see DatabaseManager.rollback_batch)."""
+        self.db_manager.rollback_batch()
+    
     # ========== Location Management ==========
     
     @property
@@ -179,6 +267,7 @@ class StateManager:
         """Get the current user location."""
         return self.db_manager.get_current_location()
     
+    @_bumps_revision
     def set_location(self, location: str) -> bool:
         """
         Set the user location.
@@ -208,6 +297,7 @@ class StateManager:
         """
         return self.db_manager.get_device_state(room, device)
     
+    @_bumps_revision
     def set_device_state(self, room: str, device: str, state: bool) -> bool:
         """
         Set the state of a device.
@@ -247,6 +337,7 @@ class StateManager:
     
     # ========== Do Not Remind Management ==========
     
+    @_bumps_revision
     def add_to_do_not_remind(self, item: str) -> None:
         """
         Add an item to the do_not_remind list.
@@ -256,6 +347,7 @@ class StateManager:
         """
         self.db_manager.add_to_do_not_remind(item)
     
+    @_bumps_revision
     def remove_from_do_not_remind(self, item: str) -> bool:
         """
         Remove an item from the do_not_remind list.
@@ -289,12 +381,14 @@ class StateManager:
         """
         return item not in self.db_manager.get_do_not_remind()
     
+    @_bumps_revision
     def clear_do_not_remind(self) -> None:
         """Clear the entire do_not_remind list."""
         self.db_manager.clear_do_not_remind()
     
     # ========== Notification Preferences Management ==========
     
+    @_bumps_revision
     def set_notification_preference(self, room: str, device: str, do_not_notify: bool) -> bool:
         """
         Set notification preference for a specific device.
@@ -328,9 +422,26 @@ class StateManager:
         Returns:
             True if should notify, False if notification is disabled for this device
         """
-        prefs = self.db_manager.get_notification_preferences()
-        device_key = f"{room} {device}"
-        return device_key not in prefs
+        return f"{room} {device}" not in self.get_notification_preference_keys()
+    
+    def get_notification_preference_keys(self) -> frozenset:
+        """
+        Get the "room device" keys of devices that should not trigger notifications.
+        
+        The set is read from the database once per state revision and reused for at most
+        STATE_CACHE_TTL seconds (other sessions may change preferences in the shared database),
+        so per-device checks are O(1) and hit no queries.
+        
+        Returns:
+            Frozenset of "<room> <device>" strings
+        """
+        now = monotonic()
+        cached = getattr(self, '_notification_pref_keys', None)
+        if cached is not None and cached[0] == self._revision and now < cached[1]:
+            return cached[2]
+        keys = frozenset(self.db_manager.get_notification_preferences())
+        self._notification_pref_keys = (self._revision, now + STATE_CACHE_TTL, keys)
+        return keys
     
     def get_notification_preferences(self) -> dict:
         """
@@ -350,12 +461,14 @@ class StateManager:
                 result[(room, device)] = True
         return result
     
+    @_bumps_revision
     def clear_notification_preferences(self) -> None:
         """Clear all notification preferences."""
         self.db_manager.clear_notification_preferences()
     
     # ========== User Information Management ==========
     
+    @_bumps_revision
     def set_user_name(self, thai: str = "", english: str = "") -> None:
         """
         Set user name in Thai and/or English.
@@ -376,6 +489,7 @@ class StateManager:
         user_info = self.db_manager.get_user_info()
         return user_info.get("name", {})
     
+    @_bumps_revision
     def set_user_schedule(self, schedule: list) -> None:
         """
         Set user's daily schedule.
@@ -386,6 +500,7 @@ class StateManager:
         """
         self.db_manager.set_schedule_items(schedule)
     
+    @_bumps_revision
     def add_schedule_item(self, time: str, activity: str) -> None:
         """
         Add a single item to the daily schedule.
@@ -396,6 +511,7 @@ class StateManager:
         """
         self.db_manager.add_schedule_item({"time": time, "activity": activity})
     
+    @_bumps_revision
     def remove_schedule_item(self, index: int) -> bool:
         """
         Remove a schedule item by index.
@@ -423,6 +539,7 @@ class StateManager:
         """
         return self.db_manager.get_schedule_items()
     
+    @_bumps_revision
     def set_user_condition(self, condition: str) -> None:
         """
         Set user's condition information (e.g., medical conditions).
@@ -442,6 +559,7 @@ class StateManager:
         user_info = self.db_manager.get_user_info()
         return user_info.get("condition", "")
     
+    @_bumps_revision
     def add_schedule_addon(self, date: str, time: str, activity: str, action: dict = None, location: str = None) -> None:
         """
         Add a temporary schedule item for a specific date (LLM only).
@@ -465,6 +583,7 @@ class StateManager:
             event["location"] = location
         self.db_manager.add_one_time_event(event)
     
+    @_bumps_revision
     def remove_schedule_addon(self, date: str, time: str = None) -> int:
         """
         Remove one-time event(s) for a specific date.
@@ -490,8 +609,13 @@ class StateManager:
         """
         from datetime import datetime
         today = datetime.now().strftime("%Y-%m-%d")
-        return self.db_manager.cleanup_old_one_time_events(today)
+        removed = self.db_manager.cleanup_old_one_time_events(today)
+        if removed:
+            # Called on every state fetch - only bump the revision when something was removed
+            self._revision += 1
+        return removed
     
+    @_bumps_revision
     def clear_all_one_time_events(self) -> int:
         """
         Clear all one-time events (for demonstration purposes).
@@ -501,6 +625,7 @@ class StateManager:
         """
         return self.db_manager.delete_all_one_time_events()
     
+    @_bumps_revision
     def reset_daily_schedule(self, current_date: str = None) -> dict:
         """
         Reset daily schedule to base schedule and clear all one-time events.
@@ -648,6 +773,7 @@ class StateManager:
             
             # Store in database
             self.db_manager.set_daily_clone(today, base_schedule)
+            self._revision += 1
             existing_clone = base_schedule
             print(f"[SCHEDULE CLONE] Created new daily_clone for {today} with {len(existing_clone)} items")
         
@@ -671,6 +797,7 @@ class StateManager:
         # Return copy of the current daily_clone with derived fields
         return final_clone
     
+    @_bumps_revision
     def set_daily_clone(self, schedule_items: list) -> bool:
         """
         Set today's schedule clone. This replaces the entire daily clone.
@@ -684,9 +811,13 @@ class StateManager:
         from datetime import datetime
         today = datetime.now().strftime("%Y-%m-%d")
         
+        # Keep the stored clone sorted by time so readers never need to re-sort it
+        # (callers usually pass it sorted already, which makes this a linear pass)
+        schedule_items = sorted(schedule_items, key=lambda x: time_to_minutes(x.get("time", "")))
         self.db_manager.set_daily_clone(today, schedule_items)
         return True
     
+    @_bumps_revision
     def update_base_schedule(self, schedule_items: list) -> bool:
         """
         Update the base schedule (original schedule) with new items.
@@ -698,18 +829,13 @@ class StateManager:
         Returns:
             True if successful
         """
-        base_schedule = self.db_manager.get_schedule_items()
+        # Times already in the base schedule, indexed once for O(1) existence checks
+        base_times = {item.get("time") for item in self.db_manager.get_schedule_items()}
         # Merge new items into base schedule
         for new_item in schedule_items:
             time = new_item.get("time")
             # Check if item with same time exists
-            existing_idx = None
-            for idx, item in enumerate(base_schedule):
-                if item.get("time") == time:
-                    existing_idx = idx
-                    break
-            
-            if existing_idx is not None:
+            if time in base_times:
                 # Update existing item - need to get ID first
                 # For now, delete and re-add (simpler)
                 self.db_manager.delete_schedule_item_by_time(time)
@@ -722,6 +848,28 @@ class StateManager:
         
         return True
     
+    @_bumps_revision
+    def upsert_base_item(self, item: dict) -> bool:
+        """
+        Add or replace the base schedule item at item["time"] without fetching the schedule.
+        
+        Args:
+            item: Schedule item to store (replaces any existing item at the same time)
+        
+        Returns:
+            True if the item was newly added, False if it replaced an existing one
+        """
+        time = item.get("time")
+        # Delete reports whether a row existed, so no existence pre-check is needed
+        replaced = self.db_manager.delete_schedule_item_by_time(time)
+        self.db_manager.add_schedule_item(item)
+        if replaced:
+            print(f"[STATE] Updated base schedule item at {time}")
+        else:
+            print(f"[STATE] Added new item to base schedule at {time}")
+        return not replaced
+    
+    @_bumps_revision
     def update_daily_clone_item(self, time: str, activity: str = None, remove: bool = False) -> bool:
         """
         Update a single item in today's schedule clone.
@@ -996,7 +1144,8 @@ class StateManager:
             custom_date: Optional custom date string in YYYY-MM-DD format (for custom clock)
         
         Returns:
-            Dictionary with current_location, devices, do_not_remind, notification_preferences, and user_info
+            Dictionary with current_location, devices, do_not_remind, notification_preferences, user_info,
+            today_active_schedule, and revision
         """
         # Format notification preferences as list of strings for easier LLM consumption
         notification_prefs_list = self.db_manager.get_notification_preferences()
@@ -1005,15 +1154,31 @@ class StateManager:
         # Pass custom_date to support custom clock timestamps
         daily_clone = self.get_daily_clone(current_date=custom_date)
         
+        # Parse schedule times once here so consumers can compare integers instead of "HH:MM" strings
+        previous_minutes = -1
+        is_sorted = True
+        for item in daily_clone:
+            item_minutes = time_to_minutes(item.get("time", ""))
+            item["time_minutes"] = item_minutes
+            if item_minutes < previous_minutes:
+                is_sorted = False
+            previous_minutes = item_minutes
+        
+        # Clones are stored sorted by time; only re-sort legacy/unsorted data
+        if not is_sorted:
+            daily_clone.sort(key=lambda x: x["time_minutes"])
+        
         return {
             "current_location": self.current_location,
             "devices": self.get_all_devices(),
             "do_not_remind": self.get_do_not_remind(),
             "notification_preferences": notification_prefs_list,
             "user_info": self.get_user_info(include_one_time_events=True),  # Include one-time events for LLM
-            "today_active_schedule": daily_clone  # Today's schedule clone used for notifications
+            "today_active_schedule": daily_clone,  # Today's schedule clone used for notifications (sorted by time)
+            "revision": self._revision  # Read after get_daily_clone, which may create today's clone
         }
     
+    @_bumps_revision
     def reset(self) -> None:
         """Reset all state to initial values (all devices OFF, default location, empty reminders)."""
         self.db_manager.set_current_location(DEFAULT_USER_LOCATION)
@@ -10,6 +10,7 @@ from pathlib import Path
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 import json
+import threading
 
 from database.models import (
     Base, DeviceState, UserInfo, ScheduleItem, OneTimeEvent,
@@ -50,6 +51,9 @@ class DatabaseManager:
         # Create session factory
         self.SessionLocal = sessionmaker(bind=self.engine)
         
+        # Per-thread session shared by get_session() calls inside batch()
+        self._batch_local = threading.local()
+        
         # Create tables
         Base.metadata.create_all(self.engine)
         
@@ -57,7 +61,15 @@ class DatabaseManager:
     
     @contextmanager
     def get_session(self):
-        """Context manager for database sessions"""
+        """Context manager for database sessions (joins the current batch() session if any)"""
+        # (getattr covers managers created before batch() existed, e.g. in a live session)
+        batch_local = getattr(self, '_batch_local', None)
+        batch_session = getattr(batch_local, 'session', None)
+        if batch_session is not None:
+            # Inside batch(): share its session; commit/rollback happen once, in batch()
+            yield batch_session
+            return
+        
         session = self.SessionLocal()
         try:
             yield session
@@ -68,6 +80,44 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that runs every operation in the block in one session and one commit.
+        
+        Reads inside the block see the block's own pending writes (autoflush). Any exception
+        rolls back the whole block. Nested batch() calls join the outer one.
+        """
+        if getattr(self, '_batch_local', None) is None:
+            self._batch_local = threading.local()
+        if getattr(self._batch_local, 'session', None) is not None:
+            yield
+            return
+        
+        session = self.SessionLocal()
+        self._batch_local.session = session
+        try:
+            yield
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._batch_local.session = None
+            session.close()
+    
+    def rollback_batch(self) -> None:
+        """
+        Discard every write made so far in the current batch() block (no-op outside a batch).
+        
+        For callers that catch an error inside the block instead of letting it propagate:
+        the batch then commits only what is written after this call, and a session left
+        in a failed state by a database error is usable again.
+        """
+        session = getattr(getattr(self, '_batch_local', None), 'session', None)
+        if session is not None:
+            session.rollback()
+    
     # ========== Device State Operations ==========
     
     def get_device_state(self, room: str, device: str) -> bool:
@@ -5,11 +5,230 @@ Handles MCP tool calling with safe parsing.
 
 import json
 import re
-from datetime import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from bisect import bisect_right
+from collections import deque, namedtuple
+from itertools import chain
+from datetime import date, datetime, timedelta, timezone
+from operator import itemgetter
 import ollama
+from cachetools import LRUCache, TTLCache
 from config import MODEL_NAME, OLLAMA_HOST, ROOMS
+from core.state import time_to_minutes, render_user_info_block
 from llm.prompts import MCP_SYSTEM_PROMPT, MCP_SYSTEM_PROMPT_COMPACT
 
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to stdlib json
+    orjson = None
+
+
+# Resolved "now" for one request (see LLMClient._resolve_time_context)
+_TimeContext = namedtuple("_TimeContext", ["timestamp", "current_date", "tomorrow_date", "current_minutes"])
+
+# Real time is reported in GMT+7, same as the app clock and schedule checks
+_GMT7 = timezone(timedelta(hours=7))
+
+# Emoji markers some models emit before their reasoning text
+_REASONING_MARKERS = ("🛌", "💭", "🤔", "🔍", "📝")
+
+# JSON repair patterns (used by _try_repair_json and the parse helpers' fallback path)
+# Trailing commas before a closing brace or bracket are stripped in one pass
+_RE_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_RE_UNQUOTED_KEY = re.compile(r'(\{|,)\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:')
+# Bare time answers such as "7", "7:30" or "0730"
+_RE_BARE_TIME = re.compile(r'^\d{1,2}[:.]?\d{0,2}$')
+
+# Conversation-pattern detectors (one alternation search instead of one substring scan per keyword)
+# Case-insensitive, so message content is searched as-is without a lower-cased copy
+_RE_QUESTION = re.compile(r"would you like|do you want|should i|can i|turn on|turn off", re.IGNORECASE)
+_RE_POSITIVE = re.compile(r"\b(?:yeah|yes|yep|sure|okay|ok|please|do it)\b", re.IGNORECASE)
+_RE_NEGATIVE = re.compile(r"\b(?:no|nope|don'?t|not|won'?t)\b", re.IGNORECASE)
+_RE_CLARIFY = re.compile(
+    r"clarify|clarification|which|what do you mean|specify|could you|please specify|do you mean"
+    r"|all devices in the house|current location|which room",
+    re.IGNORECASE
+)
+_RE_ACTION_REQUEST = re.compile(r"turn|switch|add|delete|change|schedule|everything|all devices", re.IGNORECASE)
+# Key events kept by summarize_conversation (case-insensitive), one named group per event type
+_RE_KEY_EVENT = re.compile(
+    r"(?P<device_control>turned)"
+    r"|(?P<schedule_change>schedule|appointment|meeting|added|changed|deleted)"
+    r"|(?P<preference_set>preference|keep it on)",
+    re.IGNORECASE
+)
+_KEY_EVENT_PRIORITY = ("device_control", "schedule_change", "preference_set")
+# Lifestyle topics in the last assistant reply (should_call_rag follow-up check)
+_RE_LIFESTYLE_RESPONSE = re.compile(
+    r"eat|food|meal|breakfast|lunch|dinner|snack|exercise|workout|activity|activities|physical"
+    r"|sleep|rest|routine|lifestyle|wellness|fitness|suggest|recommend|oatmeal|nutrition|diet",
+    re.IGNORECASE
+)
+
+# Context templates returned by the recent-question detectors
+_TMPL_QUESTION_PREFIX = 'You recently asked: "{question}..."\nUser responded: "{response}"\n'
+_TMPL_QUESTION_POSITIVE = _TMPL_QUESTION_PREFIX + "ACTION REQUIRED: User said yes/yeah/sure - you should TAKE ACTION (use e_device_control), NOT ask again."
+_TMPL_QUESTION_NEGATIVE = _TMPL_QUESTION_PREFIX + "IMPORTANT: User said no - acknowledge and move on, DO NOT ask the same question again."
+_TMPL_QUESTION_UNCLEAR = _TMPL_QUESTION_PREFIX + "IMPORTANT: You already asked this question. If user's response is unclear, ask for clarification ONCE, then act. Do NOT repeat the same question."
+
+# Static parts of the summarize_conversation prompt (transcript goes in between)
+_SUMMARY_PROMPT_HEAD = """Summarize this conversation focusing on:
+- User preferences and important decisions
+- Device control patterns
+- Schedule changes
+- Key information the user shared
+
+Conversation:
+"""
+_SUMMARY_PROMPT_TAIL = """
+
+Provide a concise summary (max 200 words):"""
+# Transcript characters included in the summary prompt
+_SUMMARY_TRANSCRIPT_CHARS = 2000
+# Token budget for the generated summary
+_SUMMARY_NUM_PREDICT = 300
+
+# Tool-call key markers for _looks_like_json_tool_call (case-insensitive, no lower-cased copy needed)
+_RE_TOOL_KEY = re.compile(r"\"tool\"|'tool'", re.IGNORECASE)
+_RE_TOOL_KEY_DOUBLE_QUOTED = re.compile(r'"tool"', re.IGNORECASE)
+_RE_ARGUMENTS_KEY = re.compile(r"\"arguments\"|'arguments'", re.IGNORECASE)
+
+# Tool names accepted in the alternative ["tool_name", {...}] format
+_KNOWN_TOOLS = frozenset({"e_device_control", "chat_message", "schedule_modifier", "rag_query"})
+
+# Element types kept when walking a decoded tool-call array
+_JSON_ITEM_TYPES = (dict, list, str)
+
+# Literal prefilter for _parse_tool_calls: every strategy needs a "tool" key/label
+# or a known tool name (alternative ["tool_name", {...}] format)
+_RE_TOOL_CALL_HINT = re.compile("|".join(["tool", *sorted(_KNOWN_TOOLS)]), re.IGNORECASE)
+
+# Short clarification answers recognized by the information-completion detectors
+_ROOM_ANSWERS = frozenset({'bedroom', 'bathroom', 'kitchen', 'living room', 'living'})
+_DEVICE_ANSWERS = {
+    'light': 'Light', 'lgiht': 'Light', 'ligth': 'Light',
+    'ac': 'AC', 'tv': 'TV', 'fan': 'Fan', 'alarm': 'Alarm'
+}
+
+# Intent keywords for _format_state_info_conditional.
+# Single words are matched against the message's token set (O(1) lookups, and no
+# accidental substring hits such as "ac" in "back"); only multi-word phrases are
+# scanned with "in message_lower".
+_WORD_RE = re.compile(r"\w+")
+_DEVICE_WORDS = frozenset({
+    'device', 'devices', 'light', 'lights', 'ac', 'tv', 'fan', 'fans', 'alarm', 'alarms',
+    'turn', 'switch', 'on', 'off', 'everything'
+})
+_ALL_ROOMS_WORDS = frozenset({'all', 'everywhere'})
+_SCHEDULE_WORDS = frozenset({
+    'schedule', 'schedules', 'appointment', 'appointments', 'meeting', 'meetings', 'time', 'times',
+    'activity', 'activities', 'wake', 'awake', 'waking', 'sleep', 'sleeping', 'breakfast', 'lunch', 'dinner',
+    'work', 'working', 'workout', 'study', 'studying', 'next', 'after', 'afternoon', 'later', 'upcoming', 'what'
+})
+_DELETION_WORDS = frozenset({'awake', 'delete', 'remove', 'cancel', 'skip'})
+_DELETION_PHRASES = ('work now', 'not doing', "won't", "will not")
+# Deletion case keywords from prompt rule 3 (Case 1 = won't do it, Case 2 = doing it now)
+_RE_DELETION_CASE1 = re.compile(r"\b(?:not|won'?t|cancel|skip)\b", re.IGNORECASE)
+_RE_DELETION_CASE2 = re.compile(r"\b(?:i'?m|already|now|let'?s)\b", re.IGNORECASE)
+_NEXT_WORDS = frozenset({'next', 'after', 'upcoming'})
+_USER_INFO_WORDS = frozenset({'who', 'name', 'condition', 'myself'})
+_USER_INFO_PHRASES = ('about me', 'tell me about')
+_LIFESTYLE_WORDS = frozenset({
+    'eat', 'eating', 'food', 'meal', 'meals', 'breakfast', 'lunch', 'dinner', 'snack', 'snacks',
+    'exercise', 'exercises', 'workout', 'activity', 'activities', 'sleep', 'sleeping', 'rest',
+    'routine', 'routines', 'lifestyle', 'wellness', 'fitness', 'suggest', 'recommend'
+})
+_LIFESTYLE_PHRASES = ('what should', 'what can', 'should i', 'what to', "don't know")
+
+
+# Device state labels indexed by bool (False -> "OFF", True -> "ON")
+_ONOFF = ("OFF", "ON")
+
+
+def _format_schedule_item(item: dict, upcoming: bool = False) -> str:
+    """
+    Format one schedule item as a state prompt line.
+    
+    Args:
+        item: Schedule item dict with "time", "activity" and optional "location"/"action"
+        upcoming: Whether to mark the item as [UPCOMING]
+        
+    Returns:
+        "  - HH:MM: Activity" with optional [Location], [Action] and [UPCOMING] suffixes
+    """
+    get = item.get
+    schedule_parts = [f"  - {get('time', '')}: {get('activity', '')}"]
+    
+    # Add location if present
+    location = get("location")
+    if location:
+        schedule_parts.append(f" [Location: {location}]")
+    
+    # Add action summary if present
+    action = get("action")
+    action_devices = action.get("devices") if action else None
+    if action_devices:
+        device_list = ", ".join([f"{d['room']} {d['device']} {d['state']}" for d in action_devices])
+        schedule_parts.append(f" [Action: {device_list}]")
+    
+    if upcoming:
+        schedule_parts.append(" [UPCOMING]")
+    
+    return "".join(schedule_parts)
+
+
+def _format_room_devices(room: str, room_devices: dict) -> str:
+    """
+    Format one room's device states as a single block for the state prompt.
+    
+    Args:
+        room: Room name
+        room_devices: Dict of {device: bool} (states must be bools, as stored in the database)
+        
+    Returns:
+        "  Room:" header followed by one "    - Device: ON/OFF" line per device
+    """
+    device_lines = [f"    - {device}: {_ONOFF[state]}" for device, state in room_devices.items()]
+    device_lines.insert(0, f"  {room}:")
+    return "\n".join(device_lines)
+
+
+def _format_device_states(devices: dict) -> str:
+    """
+    Format the "Device States:" block for all rooms with a single join.
+    
+    Args:
+        devices: Dict of {room: {device: bool}}
+        
+    Returns:
+        "Device States:" header followed by each room's block
+    """
+    return "\n".join(chain(
+        ("Device States:",),
+        (_format_room_devices(room, room_devices) for room, room_devices in devices.items())
+    ))
+
+
+def _json_loads(json_str: str):
+    """
+    Parse JSON using orjson when available, falling back to stdlib json.
+    
+    orjson is stricter than json (e.g. NaN/Infinity, big integers), so inputs it
+    rejects are retried with json.loads, which raises json.JSONDecodeError as before.
+    
+    Args:
+        json_str: JSON string to parse
+        
+    Returns:
+        Parsed Python object
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(json_str)
 
 def should_call_rag(user_message: str, user_condition: str = None, chat_history: list = None, current_activity: dict = None) -> bool:
     """
@@ -129,22 +348,110 @@ def should_call_rag(user_message: str, user_condition: str = None, chat_history:
                 last_assistant_msg = None
                 for msg in reversed(chat_history[-5:]):  # Check last 5 messages
                     if msg.get('role') == 'assistant':
-                        last_assistant_msg = msg.get('content', '').lower()
+                        last_assistant_msg = msg.get('content', '')
                         break
                 
                 if last_assistant_msg:
-                    lifestyle_keywords_in_response = [
-                        "eat", "food", "meal", "breakfast", "lunch", "dinner", "snack",
-                        "exercise", "workout", "activity", "activities", "physical",
-                        "sleep", "rest", "routine", "lifestyle", "wellness", "fitness",
-                        "suggest", "recommend", "oatmeal", "nutrition", "diet"
-                    ]
-                    if any(keyword in last_assistant_msg for keyword in lifestyle_keywords_in_response):
+                    # Case-insensitive search on the original text - no lower-cased copy of the reply
+                    if _RE_LIFESTYLE_RESPONSE.search(last_assistant_msg):
                         return True
     
     return False
 
 
+def _count_brackets(json_str: str) -> tuple:
+    """
+    Count braces and brackets for JSON repair.
+    
+    Uses str.count, which scans in C - on multi-KB responses this is ~20x faster than a
+    single-pass Python loop or collections.Counter, despite making four passes.
+    
+    Args:
+        json_str: JSON string to inspect
+        
+    Returns:
+        Tuple of (open_braces, close_braces, open_brackets, close_brackets)
+    """
+    return json_str.count('{'), json_str.count('}'), json_str.count('['), json_str.count(']')
+
+
+def _balance_brackets(json_str: str) -> str:
+    """
+    Append missing closing braces/brackets to a stripped JSON string.
+    
+    Shared tail of _try_repair_json and _repair_incomplete_json. Open objects are
+    closed before open arrays.
+    
+    Args:
+        json_str: Stripped, potentially incomplete JSON string
+        
+    Returns:
+        JSON string with missing closers appended (unchanged if already balanced)
+    """
+    open_braces, close_braces, open_brackets, close_brackets = _count_brackets(json_str)
+    
+    # If it looks like an incomplete JSON array (or an object inside an array context)
+    if json_str.startswith('[') or (json_str.startswith('{') and '[' in json_str[:10]):
+        if open_brackets > close_brackets or open_braces > close_braces:
+            # Close any open objects first
+            if open_braces > close_braces:
+                json_str += '}' * (open_braces - close_braces)
+            if open_brackets > close_brackets:
+                json_str += ']' * (open_brackets - close_brackets)
+    
+    # If it looks like an incomplete JSON object
+    elif json_str.startswith('{') and open_braces > close_braces:
+        json_str += '}' * (open_braces - close_braces)
+    
+    return json_str
+
+
+def _find_json_spans(text: str, open_char: str, close_char: str) -> list:
+    """
+    Find balanced JSON-like spans (e.g. [...] or {...}) in a single forward pass.
+    
+    Brackets inside double-quoted strings are ignored (respecting backslash escapes).
+    Runs in O(n), unlike nested lazy regex patterns which can backtrack heavily
+    on long reasoning text without a closing bracket.
+    
+    Args:
+        text: Text to scan
+        open_char: Opening bracket character ('[' or '{')
+        close_char: Matching closing bracket character (']' or '}')
+        
+    Returns:
+        List of (start, end) index tuples for the outermost complete spans, in order
+    """
+    spans = []
+    open_positions = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == open_char:
+            open_positions.append(i)
+        elif ch == close_char:
+            if open_positions:
+                spans.append((open_positions.pop(), i + 1))
+        elif ch == '"' and open_positions:
+            # Only track strings inside a bracket - quotes in surrounding prose are not JSON
+            in_string = True
+    
+    # Keep outermost spans only (an unclosed outer bracket leaves its inner spans outermost)
+    spans.sort(key=lambda span: (span[0], -span[1]))
+    outermost = []
+    for start, end in spans:
+        if not outermost or start >= outermost[-1][1]:
+            outermost.append((start, end))
+    return outermost
+
+
 class LLMClient:
     """
     Client for interacting with DeepSeek-R1 via Ollama.
@@ -510,12 +817,16 @@ class LLMClient:
         # Use system prompt (Phase 2.1: Prompt Reduction - use compact version if enabled)
         from config import USE_COMPACT_PROMPT
         system_prompt = MCP_SYSTEM_PROMPT_COMPACT if USE_COMPACT_PROMPT else MCP_SYSTEM_PROMPT
+        # Sections are collected and joined once, so the multi-KB base prompt is copied
+        # a single time per request instead of once per appended context block
+        system_parts = [system_prompt]
         
         # Add RAG context if available
         if rag_context:
             rag_section = self._format_rag_context(rag_context)
             if rag_section:
-                system_prompt = system_prompt + "\n\n" + rag_section
+                system_parts.append("\n\n")
+                system_parts.append(rag_section)
         
         # Add notification context to prompt if user is responding to a notification
         if recent_notification:
@@ -568,7 +879,7 @@ CRITICAL PRIORITY RULES:
 - If user says "no", "keep it on", "leave it on" → Use chat_message to acknowledge (preference will be set)
 - DO NOT ask for clarification - if user says "yes", take action immediately
 """
-            system_prompt = system_prompt + notification_context
+            system_parts.append(notification_context)
         
         # Phase 4: Optimize Detection Methods - combine scans into single pass
         # CRITICAL: If recent_notification is present, skip chat history detection (notification context takes priority)
@@ -585,7 +896,7 @@ CRITICAL PRIORITY RULES:
 
 CRITICAL: Execute the original action immediately with the provided information. Do NOT ask for clarification again.
 """
-                system_prompt = system_prompt + completion_context
+                system_parts.append(completion_context)
             else:
                 # Check for recent question patterns (yes/no responses)
                 recent_question_context = self._detect_recent_question_optimized(recent_messages)
@@ -598,41 +909,22 @@ IMPORTANT - RECENT CONVERSATION CONTEXT:
 Remember: If you already asked about controlling a device and the user responded, DO NOT ask the same question again.
 If user said "yeah", "yes", "sure", "okay" → TAKE ACTION immediately, don't ask again.
 """
-                    system_prompt = system_prompt + question_context
+                    system_parts.append(question_context)
+        
+        # Resolve current date/time once for this request (custom clock or real GMT+7 time)
+        time_context = self._resolve_time_context(custom_date, custom_time)
         
         # Phase 2: Conditional State Inclusion - only include relevant state sections
-        state_info = self._format_state_info_conditional(current_state, user_message, custom_date, custom_time)
+        state_info = self._format_state_info_conditional(current_state, user_message, custom_date, custom_time, time_context)
         
         # Add current timestamp and date for date calculations
-        # Use custom date/time if provided, otherwise use real time
-        from datetime import timedelta, timezone
-        if custom_date and custom_time:
-            # Use custom date and time
-            custom_hours, custom_minutes = custom_time
-            current_date = custom_date
-            current_time = f"{current_date} {custom_hours:02d}:{custom_minutes:02d}:00"
-            # Calculate tomorrow's date based on custom date
-            custom_datetime = datetime.strptime(custom_date, "%Y-%m-%d")
-            tomorrow_date = (custom_datetime + timedelta(days=1)).strftime("%Y-%m-%d")
-            print(f"[LLM TIMESTAMP] Using custom date/time - Date: {current_date}, Time: {custom_hours:02d}:{custom_minutes:02d}, Tomorrow: {tomorrow_date}")
-        else:
-            # Use real system time
-            current_datetime = datetime.now()
-            current_time = current_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            current_date = current_datetime.strftime("%Y-%m-%d")
-            tomorrow_date = (current_datetime + timedelta(days=1)).strftime("%Y-%m-%d")
-            print(f"[LLM TIMESTAMP] Using real date/time - Date: {current_date}, Tomorrow: {tomorrow_date}")
-        timestamp_info = f"CURRENT TIME: {current_time}\nCURRENT DATE: {current_date}\nTOMORROW'S DATE: {tomorrow_date}"
+        timestamp_info = f"CURRENT TIME: {time_context.timestamp}\nCURRENT DATE: {time_context.current_date}\nTOMORROW'S DATE: {time_context.tomorrow_date}"
         
         # Add conversation summary if available (Phase 1: Long-term memory)
-        summary_section = ""
-        if conversation_summary and conversation_summary.get("summary_text"):
-            summary_section = f"\n\nPREVIOUS CONVERSATION SUMMARY:\n{conversation_summary['summary_text']}"
-            if conversation_summary.get("key_events"):
-                events_text = "\n".join([f"- {e.get('type', 'event')}: {e.get('summary', '')[:80]}" for e in conversation_summary['key_events'][-5:]])
-                summary_section += f"\n\nRecent Key Events:\n{events_text}"
+        summary_section = self._format_summary_section(conversation_summary)
         
-        system_content = f"{system_prompt}{summary_section}\n\n{timestamp_info}\n\nCURRENT SYSTEM STATE:\n{state_info}"
+        system_parts.append(f"{summary_section}\n\n{timestamp_info}\n\nCURRENT SYSTEM STATE:\n{state_info}")
+        system_content = "".join(system_parts)
         
         messages.append({
             "role": "system",
@@ -656,6 +948,78 @@ If user said "yeah", "yes", "sure", "okay" → TAKE ACTION immediately, don't as
         
         return messages
     
+    def _resolve_time_context(self, custom_date: str = None, custom_time: tuple = None) -> _TimeContext:
+        """
+        Resolve the current date/time for one request.
+        
+        Computed once per request and shared by the timestamp section and state formatting,
+        instead of each calling datetime.now()/strftime separately.
+        
+        Args:
+            custom_date: Optional custom date string in YYYY-MM-DD format (for custom clock)
+            custom_time: Optional custom time tuple (hours, minutes) (for custom clock)
+            
+        Returns:
+            _TimeContext(timestamp, current_date, tomorrow_date, current_minutes)
+        """
+        now = None
+        if custom_time:
+            hours, minutes = custom_time
+            seconds = 0
+        else:
+            now = datetime.now(_GMT7)
+            hours, minutes, seconds = now.hour, now.minute, now.second
+        
+        if custom_date:
+            today = date.fromisoformat(custom_date)
+        else:
+            today = (now or datetime.now(_GMT7)).date()
+        
+        current_date = today.isoformat()
+        tomorrow_date = (today + timedelta(days=1)).isoformat()
+        if custom_date and custom_time:
+            print(f"[LLM TIMESTAMP] Using custom date/time - Date: {current_date}, Time: {hours:02d}:{minutes:02d}, Tomorrow: {tomorrow_date}")
+        else:
+            print(f"[LLM TIMESTAMP] Using real date/time - Date: {current_date}, Tomorrow: {tomorrow_date}")
+        
+        return _TimeContext(
+            timestamp=f"{current_date} {hours:02d}:{minutes:02d}:{seconds:02d}",
+            current_date=current_date,
+            tomorrow_date=tomorrow_date,
+            current_minutes=hours * 60 + minutes
+        )
+    
+    def _format_summary_section(self, conversation_summary: dict) -> str:
+        """
+        Format the conversation summary section of the system prompt.
+        
+        The summary only changes when a new batch of messages is summarized, so the
+        formatted section is cached on the summary dict under "_formatted_section"
+        and reused until summary_text or key_events change.
+        
+        Args:
+            conversation_summary: Dict with "summary_text" and "key_events" keys
+            
+        Returns:
+            Formatted summary section, or empty string if there is no summary
+        """
+        if not conversation_summary or not conversation_summary.get("summary_text"):
+            return ""
+        
+        summary_text = conversation_summary["summary_text"]
+        key_events = conversation_summary.get("key_events") or []
+        cached = conversation_summary.get("_formatted_section")
+        if cached and cached[0] == summary_text and cached[1] == len(key_events):
+            return cached[2]
+        
+        summary_section = f"\n\nPREVIOUS CONVERSATION SUMMARY:\n{summary_text}"
+        if key_events:
+            events_text = "\n".join([f"- {e.get('type', 'event')}: {e.get('summary', '')[:80]}" for e in key_events[-5:]])
+            summary_section += f"\n\nRecent Key Events:\n{events_text}"
+        
+        conversation_summary["_formatted_section"] = (summary_text, len(key_events), summary_section)
+        return summary_section
+    
     def _format_rag_context(self, rag_context: dict) -> str:
         """
         Format RAG context for injection into system prompt.
@@ -770,17 +1134,31 @@ IMPORTANT:
         
         lines.append(f"Current Location: {location}")
         lines.append("")
-        lines.append("Device States:")
-        
-        for room, room_devices in devices.items():
-            lines.append(f"  {room}:")
-            for device, state in room_devices.items():
-                status = "ON" if state else "OFF"
-                lines.append(f"    - {device}: {status}")
+        lines.append(_format_device_states(devices))
         
         return "\n".join(lines)
     
-    def _format_state_info_conditional(self, current_state: dict, user_message: str, custom_date: str = None, custom_time: tuple = None) -> str:
+    def _get_user_info_block(self, user_info: dict) -> str:
+        """
+        Get the rendered "USER INFORMATION:" block, reusing the last rendering while the
+        name and condition are unchanged (they rarely change between requests).
+        
+        Args:
+            user_info: user_info dict from the current state
+            
+        Returns:
+            Block text without a trailing newline
+        """
+        name = user_info.get("name") or {}
+        key = (name.get("thai"), name.get("english"), user_info.get("condition", ""))
+        # (getattr covers clients created before this cache existed, e.g. in a live session)
+        cached = getattr(self, '_user_info_block', None)
+        if cached is None or cached[0] != key:
+            cached = (key, render_user_info_block(user_info))
+            self._user_info_block = cached
+        return cached[1]
+    
+    def _format_state_info_conditional(self, current_state: dict, user_message: str, custom_date: str = None, custom_time: tuple = None, time_context: _TimeContext = None) -> str:
         """
         Format state information conditionally based on query intent (with caching - Phase 2.2).
         Only includes relevant sections to reduce token count.
@@ -790,6 +1168,7 @@ IMPORTANT:
             user_message: User's current message for intent detection
             custom_date: Optional custom date string
             custom_time: Optional custom time tuple
+            time_context: Optional pre-resolved _TimeContext (resolved from custom_date/custom_time if None)
             
         Returns:
             Formatted string with only relevant state information
@@ -798,34 +1177,35 @@ IMPORTANT:
             return "State information unavailable."
         
         # Check cache (Phase 2.2: Smart State Caching)
-        import time
-        import hashlib
-        
         # Initialize cache if it doesn't exist (for instances created before this optimization)
+        # TTLCache handles both the 500ms expiry and LRU eviction beyond 10 entries
         if not hasattr(self, '_state_cache'):
-            self._state_cache = {}
-        
-        # Create cache key: hash of state dict + user_message + custom_date/time
-        cache_key_data = {
-            'state': current_state,
-            'user_message': user_message,
-            'custom_date': custom_date,
-            'custom_time': custom_time
-        }
-        cache_key_str = str(sorted(cache_key_data.items()))
-        cache_key = hashlib.md5(cache_key_str.encode()).hexdigest()
+            self._state_cache = TTLCache(maxsize=10, ttl=0.5)
+        
+        # Create cache key: state revision + user_message + custom_date/time
+        # Same revision means same stored state, so the state dict doesn't need to be serialized.
+        # current_activity comes from the app (not the state store) so it is keyed separately.
+        revision = current_state.get("revision")
+        if revision is not None:
+            cache_key = (revision, user_message, custom_date, custom_time, str(current_state.get("current_activity")))
+        else:
+            # No revision (state not built by StateManager) - key by the stringified state dict
+            # (the string is hashable as-is, so no md5 digest is needed)
+            cache_key_data = {
+                'state': current_state,
+                'user_message': user_message,
+                'custom_date': custom_date,
+                'custom_time': custom_time
+            }
+            cache_key = str(sorted(cache_key_data.items()))
         
         # Check if cached and still valid (500ms TTL)
-        if cache_key in self._state_cache:
-            cached_entry = self._state_cache[cache_key]
-            cache_age = time.time() - cached_entry['timestamp']
-            if cache_age < 0.5:  # 500ms TTL
-                return cached_entry['formatted']
-            else:
-                # Cache expired, remove it
-                del self._state_cache[cache_key]
+        cached = self._state_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         message_lower = user_message.lower()
+        message_tokens = frozenset(_WORD_RE.findall(message_lower))
         location = current_state.get("current_location", "Unknown")
         devices = current_state.get("devices", {})
         user_info = current_state.get("user_info", {})
@@ -840,18 +1220,10 @@ IMPORTANT:
         # Check for "What should I do" queries - always emphasize CURRENT ACTIVITY
         is_what_should_i_do = any(phrase in message_lower for phrase in ["what should i do", "what should i", "what do i need to do", "what do i do"])
         
-        # Calculate current time for activity period check
-        current_time_str = None
-        if custom_time:
-            # Use custom time if provided
-            current_hours, current_minutes = custom_time
-            current_time_str = f"{current_hours:02d}:{current_minutes:02d}"
-        else:
-            # Use real time
-            from datetime import datetime, timedelta, timezone
-            gmt7 = timezone(timedelta(hours=7))
-            current_time = datetime.now(gmt7)
-            current_time_str = current_time.strftime("%H:%M")
+        # Current time for activity period and upcoming schedule checks
+        if time_context is None:
+            time_context = self._resolve_time_context(custom_date, custom_time)
+        current_total = time_context.current_minutes
         
         # Add current activity context if available and within activity period
         current_activity = current_state.get("current_activity")
@@ -863,35 +1235,19 @@ IMPORTANT:
             
             # Check if current time is within activity period
             is_within_period = True
-            if activity_time and current_time_str:
-                try:
-                    # Parse times
-                    activity_parts = activity_time.split(":")
-                    activity_hours = int(activity_parts[0])
-                    activity_minutes = int(activity_parts[1])
-                    activity_total = activity_hours * 60 + activity_minutes
-                    
-                    current_parts = current_time_str.split(":")
-                    current_hours = int(current_parts[0])
-                    current_minutes = int(current_parts[1])
-                    current_total = current_hours * 60 + current_minutes
-                    
+            if activity_time:
+                # Parse times (-1 means unparseable - assume within period as fallback)
+                activity_total = time_to_minutes(activity_time)
+                if activity_total >= 0:
                     # Check if current time is after activity start time
                     if current_total < activity_total:
                         is_within_period = False
                     
                     # Check if current time is before end time (if end_time exists)
                     if end_time:
-                        end_parts = end_time.split(":")
-                        end_hours = int(end_parts[0])
-                        end_minutes = int(end_parts[1])
-                        end_total = end_hours * 60 + end_minutes
-                        
-                        if current_total >= end_total:
+                        end_total = time_to_minutes(end_time)
+                        if end_total >= 0 and current_total >= end_total:
                             is_within_period = False
-                except (ValueError, IndexError):
-                    # If parsing fails, assume within period (fallback)
-                    pass
             
             # Only show as CURRENT ACTIVITY if within the activity period
             if is_within_period:
@@ -911,165 +1267,104 @@ IMPORTANT:
                 lines.append("")
         
         # Device queries: include device states
-        device_keywords = ['device', 'light', 'ac', 'tv', 'fan', 'alarm', 'turn', 'switch', 'on', 'off', 'everything', 'all devices']
-        is_device_query = any(word in message_lower for word in device_keywords)
+        is_device_query = not _DEVICE_WORDS.isdisjoint(message_tokens)
         
         if is_device_query:
-            lines.append("Device States:")
             # Include all rooms for "all rooms" queries, otherwise just current room
-            if 'all rooms' in message_lower or 'everywhere' in message_lower or 'all' in message_lower:
-                # Include all rooms
-                for room, room_devices in devices.items():
-                    lines.append(f"  {room}:")
-                    for device, state in room_devices.items():
-                        status = "ON" if state else "OFF"
-                        lines.append(f"    - {device}: {status}")
+            if not _ALL_ROOMS_WORDS.isdisjoint(message_tokens):
+                # Include all rooms (whole block built with a single join)
+                lines.append(_format_device_states(devices))
             else:
                 # Include only current room (most common case)
-                if location in devices:
-                    lines.append(f"  {location}:")
-                    for device, state in devices[location].items():
-                        status = "ON" if state else "OFF"
-                        lines.append(f"    - {device}: {status}")
+                lines.append("Device States:")
+                room_devices = devices.get(location)
+                if room_devices is not None:
+                    lines.append(_format_room_devices(location, room_devices))
             lines.append("")
         
         # Schedule queries: include schedule
-        schedule_keywords = ['schedule', 'appointment', 'meeting', 'time', 'activity', 'wake', 'sleep', 'breakfast', 'lunch', 'dinner', 'work', 'study', 'next', 'after', 'later', 'upcoming', 'what']
-        is_schedule_query = any(word in message_lower for word in schedule_keywords)
+        is_schedule_query = not _SCHEDULE_WORDS.isdisjoint(message_tokens)
         
         # Check for deletion keywords that need full schedule visibility
-        deletion_keywords = ['awake', 'work now', 'delete', 'remove', 'cancel', 'skip', 'not doing', "won't", "will not"]
-        is_deletion_query = any(keyword in message_lower for keyword in deletion_keywords)
+        is_deletion_query = (not _DELETION_WORDS.isdisjoint(message_tokens)
+                             or any(phrase in message_lower for phrase in _DELETION_PHRASES))
         
         # Schedule queries OR deletion queries: include schedule with full details
         if is_schedule_query or is_deletion_query:
             if today_active_schedule:
-                # Sort schedule by time to make it easier to find "next"
-                sorted_schedule = sorted(today_active_schedule, key=lambda x: x.get("time", ""))
-                
-                # Get current time for comparison
-                from datetime import datetime
-                if custom_date and custom_time:
-                    custom_hours, custom_minutes = custom_time
-                    current_time_str = f"{custom_hours:02d}:{custom_minutes:02d}"
+                # StateManager.get_state_summary provides the schedule already sorted, with
+                # precomputed time_minutes; only parse and sort here if state came from elsewhere
+                if today_active_schedule and "time_minutes" in today_active_schedule[0]:
+                    schedule_minutes = [(item["time_minutes"], item) for item in today_active_schedule]
                 else:
-                    current_time_str = datetime.now().strftime("%H:%M")
+                    schedule_minutes = [(time_to_minutes(item.get("time", "")), item) for item in today_active_schedule]
+                    schedule_minutes.sort(key=itemgetter(0))
+                
+                # Index of the first activity after the current time (binary search on sorted minutes)
+                first_upcoming = bisect_right([item_minutes for item_minutes, _ in schedule_minutes], current_total)
                 
                 lines.append("TODAY'S ACTIVE SCHEDULE (sorted by time):")
-                for item in sorted_schedule:
-                    time = item.get("time", "")
-                    activity = item.get("activity", "")
-                    
-                    # Build schedule line with optional fields
-                    schedule_line = f"  - {time}: {activity}"
-                    
-                    # Add location if present
-                    if "location" in item and item["location"]:
-                        schedule_line += f" [Location: {item['location']}]"
-                    
-                    # Add action summary if present
-                    if "action" in item and item.get("action", {}).get("devices"):
-                        devices = item["action"]["devices"]
-                        device_list = ", ".join([f"{d['room']} {d['device']} {d['state']}" for d in devices])
-                        schedule_line += f" [Action: {device_list}]"
-                    
-                    # Mark upcoming activities (after current time)
-                    if time > current_time_str:
-                        schedule_line += " [UPCOMING]"
-                    
-                    lines.append(schedule_line)
+                # Mark upcoming activities (after current time)
+                lines.extend(
+                    _format_schedule_item(item, upcoming=index >= first_upcoming)
+                    for index, (_, item) in enumerate(schedule_minutes)
+                )
                 lines.append("")
                 
                 # Explicitly show next activity if query is about "next"
-                if 'next' in message_lower or 'after' in message_lower or 'upcoming' in message_lower:
-                    upcoming_items = [item for item in sorted_schedule if item.get("time", "") > current_time_str]
-                    if upcoming_items:
-                        next_item = upcoming_items[0]
+                if not _NEXT_WORDS.isdisjoint(message_tokens):
+                    if first_upcoming < len(schedule_minutes):
+                        next_item = schedule_minutes[first_upcoming][1]
                         lines.append(f"NEXT ACTIVITY: {next_item.get('time')} - {next_item.get('activity')}")
                         lines.append("")
             
             # Include one-time events if any
             one_time_events = user_info.get("one_time_events", [])
             if one_time_events:
-                from datetime import datetime
-                today = datetime.now().strftime("%Y-%m-%d")
+                today = time_context.current_date
                 today_events = [item for item in one_time_events if item.get("date") == today]
                 if today_events:
                     lines.append("Today's Additional Schedule (one-time events):")
-                    for item in today_events:
-                        time = item.get("time", "")
-                        activity = item.get("activity", "")
-                        
-                        # Build schedule line with optional fields
-                        schedule_line = f"  - {time}: {activity}"
-                        
-                        # Add location if present
-                        if "location" in item and item["location"]:
-                            schedule_line += f" [Location: {item['location']}]"
-                        
-                        # Add action summary if present
-                        if "action" in item and item.get("action", {}).get("devices"):
-                            devices = item["action"]["devices"]
-                            device_list = ", ".join([f"{d['room']} {d['device']} {d['state']}" for d in devices])
-                            schedule_line += f" [Action: {device_list}]"
-                        
-                        lines.append(schedule_line)
+                    lines.extend(_format_schedule_item(item) for item in today_events)
+                    lines.append("")
+            
+            # Pre-classify deletion requests with the rule 3 keywords (Case 1 wins, as in
+            # "I'm not doing work") so the model doesn't have to re-derive the case
+            if is_deletion_query:
+                if _RE_DELETION_CASE1.search(user_message):
+                    lines.append("DELETION CASE: CASE 1 (user will NOT do the activity) - delete schedule item only, no device controls")
+                    lines.append("")
+                elif _RE_DELETION_CASE2.search(user_message):
+                    lines.append("DELETION CASE: CASE 2 (user IS doing the activity now) - delete schedule item AND execute its devices (except Alarm)")
                     lines.append("")
         
         # User info queries: include user info (Phase 3: Static caching - only when needed)
-        user_info_keywords = ['who', 'name', 'condition', 'about me', 'myself', 'tell me about']
-        is_user_info_query = any(word in message_lower for word in user_info_keywords)
+        is_user_info_query = (not _USER_INFO_WORDS.isdisjoint(message_tokens)
+                              or any(phrase in message_lower for phrase in _USER_INFO_PHRASES))
         
         # CRITICAL: Also include USER INFORMATION for lifestyle queries (food, exercise, activities, sleep, routines)
-        lifestyle_keywords = ['eat', 'food', 'meal', 'breakfast', 'lunch', 'dinner', 'snack', 'exercise', 'workout', 
-                             'activity', 'activities', 'sleep', 'rest', 'routine', 'lifestyle', 'wellness', 'fitness',
-                             'suggest', 'recommend', 'what should', 'what can', 'should i', 'what to', "don't know what", "don't know"]
-        is_lifestyle_query = any(keyword in message_lower for keyword in lifestyle_keywords)
+        is_lifestyle_query = (not _LIFESTYLE_WORDS.isdisjoint(message_tokens)
+                              or any(phrase in message_lower for phrase in _LIFESTYLE_PHRASES))
         
         if (is_user_info_query or is_lifestyle_query) and user_info:
-            lines.append("USER INFORMATION:")
-            name = user_info.get("name", {})
-            if name.get("thai") or name.get("english"):
-                name_parts = []
-                if name.get("thai"):
-                    name_parts.append(f"Thai: {name['thai']}")
-                if name.get("english"):
-                    name_parts.append(f"English: {name['english']}")
-                lines.append(f"  Name: {', '.join(name_parts)}")
+            lines.append(self._get_user_info_block(user_info))
             
-            condition = user_info.get("condition", "")
-            if condition:
-                lines.append(f"  Condition: {condition}")
-                # CRITICAL: Add explicit note for lifestyle queries
-                if is_lifestyle_query:
-                    lines.append(f"  [CRITICAL: All recommendations MUST be tailored to this condition]")
+            # CRITICAL: Add explicit note for lifestyle queries
+            if is_lifestyle_query and user_info.get("condition", ""):
+                lines.append(f"  [CRITICAL: All recommendations MUST be tailored to this condition]")
             lines.append("")
         
         # If no specific sections added, include minimal state (location + current room devices)
         if len(lines) <= 2:  # Only location and empty line
             lines.append("Device States:")
-            if location in devices:
-                lines.append(f"  {location}:")
-                for device, state in devices[location].items():
-                    status = "ON" if state else "OFF"
-                    lines.append(f"    - {device}: {status}")
+            room_devices = devices.get(location)
+            if room_devices is not None:
+                lines.append(_format_room_devices(location, room_devices))
         
         formatted_result = "\n".join(lines)
         
         # Cache the result (Phase 2.2: Smart State Caching)
-        import time
-        import hashlib
-        self._state_cache[cache_key] = {
-            'formatted': formatted_result,
-            'timestamp': time.time()
-        }
-        
-        # Clean up old cache entries (keep only last 10)
-        if len(self._state_cache) > 10:
-            # Remove oldest entries
-            sorted_entries = sorted(self._state_cache.items(), key=lambda x: x[1]['timestamp'])
-            for old_key, _ in sorted_entries[:-10]:
-                del self._state_cache[old_key]
+        self._state_cache[cache_key] = formatted_result
         
         return formatted_result
     
@@ -1087,6 +1382,15 @@ IMPORTANT:
         if not response_text:
             return ""
         
+        # Fast path: response already starts with JSON and has no reasoning to strip
+        stripped = response_text.strip()
+        if (stripped.startswith(('[', '{'))
+                and stripped.endswith((']', '}'))
+                and "</think>" not in response_text
+                and "</reasoning>" not in response_text
+                and not any(marker in response_text for marker in _REASONING_MARKERS)):
+            return stripped
+        
         # Remove common reasoning markers
         # DeepSeek-R1 uses </reasoning> or </think> tags
         # Check for </think> first (more specific)
@@ -1106,8 +1410,7 @@ IMPORTANT:
         
         # Remove emoji reasoning markers and text before them
         # But be careful - only remove if we can find JSON after
-        reasoning_markers = ["🛌", "💭", "🤔", "🔍", "📝"]
-        for marker in reasoning_markers:
+        for marker in _REASONING_MARKERS:
             if marker in response_text:
                 # Try to find JSON after the marker
                 marker_pos = response_text.find(marker)
@@ -1122,43 +1425,43 @@ IMPORTANT:
         # More aggressive: Find last JSON array/object in response (likely the actual tool call)
         # This handles cases where LLM repeats user message before JSON
         
+        # Single forward pass per bracket type (no nested lazy quantifiers -> no catastrophic backtracking)
+        array_spans = _find_json_spans(response_text, '[', ']')
+        
         # Strategy 1: Look for JSON array patterns with "tool" keyword (multiple tool calls)
-        json_arrays = list(re.finditer(r'\[[\s\S]*?\{[\s\S]*?"tool"[\s\S]*?\}[\s\S]*?\]', response_text))
-        if json_arrays:
-            # Get the last match (most likely the actual response)
-            return json_arrays[-1].group(0).strip()
+        # Get the last match (most likely the actual response)
+        for start, end in reversed(array_spans):
+            json_str = response_text[start:end]
+            if '"tool"' in json_str and '{' in json_str:
+                return json_str
         
         # Strategy 2: Look for alternative format: ["tool_name", {...}]
-        alt_format_arrays = list(re.finditer(r'\[[\s\S]*?"(?:chat_message|e_device_control|schedule_modifier|rag_query)"[\s\S]*?\{[\s\S]*?\}[\s\S]*?\]', response_text))
-        if alt_format_arrays:
-            # Get the last match
-            return alt_format_arrays[-1].group(0).strip()
+        for start, end in reversed(array_spans):
+            json_str = response_text[start:end]
+            if '{' in json_str and any(f'"{name}"' in json_str for name in ("chat_message", "e_device_control", "schedule_modifier", "rag_query")):
+                return json_str
         
         # Strategy 3: Look for any JSON array that might contain tool calls (more lenient)
-        any_json_arrays = list(re.finditer(r'\[[\s\S]*?\{[\s\S]*?\}[\s\S]*?\]', response_text))
-        if any_json_arrays:
-            # Check each match to see if it looks like a tool call
-            for match in reversed(any_json_arrays):  # Start from last
-                json_str = match.group(0).strip()
-                # Check if it contains tool-related keywords
-                if '"tool"' in json_str or '"schedule_modifier"' in json_str or '"chat_message"' in json_str or '"e_device_control"' in json_str:
-                    return json_str
+        for start, end in reversed(array_spans):  # Start from last
+            json_str = response_text[start:end]
+            # Check if it contains tool-related keywords
+            if '{' in json_str and ('"tool"' in json_str or '"schedule_modifier"' in json_str or '"chat_message"' in json_str or '"e_device_control"' in json_str):
+                return json_str
+        
+        object_spans = _find_json_spans(response_text, '{', '}')
         
         # Strategy 4: Look for JSON object patterns with "tool" keyword (single tool call)
-        json_objects = list(re.finditer(r'\{[\s\S]*?"tool"[\s\S]*?\}', response_text))
-        if json_objects:
-            # Get the last match
-            return json_objects[-1].group(0).strip()
+        for start, end in reversed(object_spans):
+            json_str = response_text[start:end]
+            if '"tool"' in json_str:
+                return json_str
         
         # Strategy 5: Look for any JSON object that might be a tool call (more lenient)
-        any_json_objects = list(re.finditer(r'\{[\s\S]*?\}', response_text))
-        if any_json_objects:
-            # Check each match to see if it looks like a tool call
-            for match in reversed(any_json_objects):  # Start from last
-                json_str = match.group(0).strip()
-                # Check if it contains tool-related keywords
-                if '"tool"' in json_str or '"schedule_modifier"' in json_str or '"chat_message"' in json_str or '"e_device_control"' in json_str:
-                    return json_str
+        for start, end in reversed(object_spans):  # Start from last
+            json_str = response_text[start:end]
+            # Check if it contains tool-related keywords
+            if '"schedule_modifier"' in json_str or '"chat_message"' in json_str or '"e_device_control"' in json_str:
+                return json_str
         
         # Return original if no JSON found
         return response_text.strip()
@@ -1182,61 +1485,68 @@ IMPORTANT:
         if not response_text:
             return []
         
-        # Strategy 1: Markdown code blocks (most common format) - EARLY EXIT on success
-        match = self._compiled_patterns['markdown_array'].search(response_text)
-        if match:
-            json_str = match.group(1)
-            parsed = self._parse_json_array_safely(json_str)
-            if parsed:
-                return parsed
-        
-        match = self._compiled_patterns['markdown_object'].search(response_text)
-        if match:
-            json_str = match.group(1)
-            result = self._parse_json_safely(json_str)
-            if result and result.get("tool"):
-                return [result]
-        
-        # Strategy 2: Direct JSON patterns (without markdown) - EARLY EXIT on success
-        matches = self._compiled_patterns['json_array_with_tool'].finditer(response_text)
-        for match in matches:
-            json_str = match.group(0)
-            parsed = self._parse_json_array_safely(json_str)
-            if parsed:
-                return parsed
-        
-        matches = self._compiled_patterns['json_object_with_tool'].finditer(response_text)
-        for match in matches:
-            json_str = match.group(0)
-            result = self._parse_json_safely(json_str)
-            if result and result.get("tool"):
-                return [result]
-        
-        # Strategy 3: Fallback lenient patterns (only if above fail) - with repair attempts
-        matches = self._compiled_patterns['json_array_lenient'].finditer(response_text)
-        for match in matches:
-            json_str = match.group(0)
-            # Only repair if initial parse fails
-            parsed = self._parse_json_array_safely(json_str)
-            if parsed:
-                return parsed
-            # Try repair as fallback
-            json_str = self._try_repair_json(json_str)
-            parsed = self._parse_json_array_safely(json_str)
-            if parsed:
-                return parsed
-        
-        matches = self._compiled_patterns['json_object_lenient'].finditer(response_text)
-        for match in matches:
-            json_str = match.group(0)
-            result = self._parse_json_safely(json_str)
-            if result and result.get("tool"):
-                return [result]
-            # Try repair as fallback
-            json_str = self._try_repair_json(json_str)
-            result = self._parse_json_safely(json_str)
-            if result and result.get("tool"):
-                return [result]
+        # Fast path: plain chat text with no tool marker can't match any strategy below
+        if _RE_TOOL_CALL_HINT.search(response_text) is None:
+            return []
+        
+        # Literal guards: each strategy's patterns require these substrings, so a missing
+        # literal lets us skip that strategy's regex scans over the whole response
+        has_fence = '```' in response_text
+        has_brace = '{' in response_text
+        
+        if has_fence:
+            # Strategy 1: Markdown code blocks (most common format) - EARLY EXIT on success
+            match = self._compiled_patterns['markdown_array'].search(response_text)
+            if match:
+                json_str = match.group(1)
+                parsed = self._parse_json_array_safely(json_str)
+                if parsed:
+                    return parsed
+            
+            match = self._compiled_patterns['markdown_object'].search(response_text)
+            if match:
+                json_str = match.group(1)
+                result = self._parse_json_safely(json_str)
+                if result and result.get("tool"):
+                    return [result]
+        
+        if has_brace and '"tool"' in response_text:
+            # Strategy 2: Direct JSON patterns (without markdown) - EARLY EXIT on success
+            matches = self._compiled_patterns['json_array_with_tool'].finditer(response_text)
+            for match in matches:
+                json_str = match.group(0)
+                parsed = self._parse_json_array_safely(json_str)
+                if parsed:
+                    return parsed
+            
+            matches = self._compiled_patterns['json_object_with_tool'].finditer(response_text)
+            for match in matches:
+                json_str = match.group(0)
+                result = self._parse_json_safely(json_str)
+                if result and result.get("tool"):
+                    return [result]
+        
+        if has_brace:
+            # Strategy 3: Fallback lenient patterns (only if above fail) - with repair attempts
+            matches = self._compiled_patterns['json_array_lenient'].finditer(response_text)
+            for match in matches:
+                json_str = match.group(0)
+                # Repair is only attempted if the initial parse fails
+                parsed = self._parse_json_array_safely(json_str, try_repair=True)
+                if parsed:
+                    return parsed
+            
+            matches = self._compiled_patterns['json_object_lenient'].finditer(response_text)
+            for match in matches:
+                json_str = match.group(0)
+                result = self._parse_json_safely(json_str)
+                if result and result.get("tool"):
+                    return [result]
+                # Try repair as fallback
+                json_str = self._try_repair_json(json_str)
+                result = self._parse_json_safely(json_str)
+                if result and result.get("tool"):
+                    return [result]
         
         # Strategy 4: Structured text patterns (last resort)
         tool_match = self._compiled_patterns['tool_name'].search(response_text)
@@ -1270,83 +1580,70 @@ IMPORTANT:
         json_str = json_str.strip()
         
         # Fix trailing commas
-        json_str = re.sub(r',\s*}', '}', json_str)
-        json_str = re.sub(r',\s*]', ']', json_str)
+        json_str = _RE_TRAILING_COMMA.sub(r'\1', json_str)
         
         # Fix missing quotes around keys (common LLM mistake)
         # Pattern: {key: value} -> {"key": value}
-        json_str = re.sub(r'(\{|,)\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'\1"\2":', json_str)
+        json_str = _RE_UNQUOTED_KEY.sub(r'\1"\2":', json_str)
         
         # Try to balance brackets/braces
-        open_braces = json_str.count('{')
-        close_braces = json_str.count('}')
-        open_brackets = json_str.count('[')
-        close_brackets = json_str.count(']')
-        
-        # If it starts with [ or {, try to close it
-        if json_str.startswith('[') and open_brackets > close_brackets:
-            missing = open_brackets - close_brackets
-            # Close any open objects first
-            if open_braces > close_braces:
-                json_str += '}' * (open_braces - close_braces)
-            json_str += ']' * missing
-        elif json_str.startswith('{') and open_braces > close_braces:
-            missing = open_braces - close_braces
-            json_str += '}' * missing
-        
-        return json_str
+        return _balance_brackets(json_str)
     
-    def _repair_incomplete_json(self, json_str: str) -> str:
+    def _finalize_parsed_array(self, parsed) -> list:
         """
-        Try to repair incomplete JSON by adding missing closing braces/brackets.
+        Convert a decoded JSON value into a list of tool call dicts.
+        
+        Shared by the primary and repair paths of _parse_json_array_safely. Uses exact
+        type() checks - json/orjson only ever produce plain dict/list/str.
         
         Args:
-            json_str: Potentially incomplete JSON string
+            parsed: Decoded JSON value
             
         Returns:
-            Repaired JSON string, or original if repair fails
+            List of tool call dicts, empty list if parsed is not a list
         """
-        if not json_str:
-            return json_str
-        
-        json_str = json_str.strip()
-        
-        # Count opening and closing braces/brackets
-        open_braces = json_str.count('{')
-        close_braces = json_str.count('}')
-        open_brackets = json_str.count('[')
-        close_brackets = json_str.count(']')
-        
-        # If it looks like an incomplete JSON object
-        if json_str.startswith('{') and open_braces > close_braces:
-            # Try to complete it
-            missing_braces = open_braces - close_braces
-            # Check if it's inside an array context
-            if json_str.startswith('[') or (open_brackets > 0 and open_brackets > close_brackets):
-                # It's an array, need to close object then array
-                json_str += '}' * missing_braces
-                if open_brackets > close_brackets:
-                    json_str += ']' * (open_brackets - close_brackets)
-            else:
-                # Just an object
-                json_str += '}' * missing_braces
-        
-        # If it looks like an incomplete JSON array
-        elif json_str.startswith('[') and open_brackets > close_brackets:
-            missing_brackets = open_brackets - close_brackets
-            # Close any open objects first
-            if open_braces > close_braces:
-                json_str += '}' * (open_braces - close_braces)
-            json_str += ']' * missing_brackets
+        if type(parsed) is not list:
+            return []
         
-        return json_str
+        # NEW: Handle case where the entire array IS in format ["tool_name", {...}]
+        # This happens when LLM uses simplified format: ["e_device_control", {...}]
+        if len(parsed) == 2 and type(parsed[0]) is str and type(parsed[1]) is dict:
+            tool_name = parsed[0]
+            args = parsed[1]
+            # Validate it's a known tool name
+            if tool_name in _KNOWN_TOOLS:
+                return [{"tool": tool_name, "arguments": args}]
+        
+        # Filter out empty strings, None, and invalid entries
+        parsed = [item for item in parsed if item and item != "" and item != [] and item != {}]
+        
+        tool_calls = []
+        for item in parsed:
+            # Skip None or invalid types
+            if not item or type(item) not in _JSON_ITEM_TYPES:
+                continue
+            
+            # Handle alternative format: ["tool_name", {...}]
+            if type(item) is list and len(item) == 2:
+                tool_name = item[0]
+                args = item[1]
+                if type(tool_name) is str and type(args) is dict:
+                    tool_calls.append({"tool": tool_name, "arguments": args})
+                    continue
+            
+            # Handle standard format: {"tool": "...", "arguments": {...}}
+            if type(item) is dict and "tool" in item:
+                tool_calls.append(item)
+        return tool_calls
     
-    def _parse_json_array_safely(self, json_str: str) -> list:
+    def _parse_json_array_safely(self, json_str: str, try_repair: bool = False) -> list:
         """
         Safely parse JSON array string containing multiple tool calls.
         
         Args:
             json_str: JSON array string to parse
+            try_repair: If True, run _try_repair_json before the second parse attempt
+                        instead of only stripping trailing commas
             
         Returns:
             List of tool call dicts if successful, empty list otherwise
@@ -1356,78 +1653,16 @@ IMPORTANT:
         
         try:
             json_str = json_str.strip()
-            parsed = json.loads(json_str)
-            
-            if isinstance(parsed, list):
-                # NEW: Handle case where the entire array IS in format ["tool_name", {...}]
-                # This happens when LLM uses simplified format: ["e_device_control", {...}]
-                if len(parsed) == 2 and isinstance(parsed[0], str) and isinstance(parsed[1], dict):
-                    tool_name = parsed[0]
-                    args = parsed[1]
-                    # Validate it's a known tool name
-                    if tool_name in ["e_device_control", "chat_message", "schedule_modifier", "rag_query"]:
-                        return [{"tool": tool_name, "arguments": args}]
-                
-                # Filter out empty strings, None, and invalid entries
-                parsed = [item for item in parsed if item and item != "" and item != [] and item != {}]
-                
-                tool_calls = []
-                for item in parsed:
-                    # Skip None or invalid types
-                    if not item or not isinstance(item, (dict, list, str)):
-                        continue
-                    
-                    # Handle alternative format: ["tool_name", {...}]
-                    if isinstance(item, list) and len(item) == 2:
-                        tool_name = item[0]
-                        args = item[1]
-                        if isinstance(tool_name, str) and isinstance(args, dict):
-                            tool_calls.append({"tool": tool_name, "arguments": args})
-                            continue
-                    
-                    # Handle standard format: {"tool": "...", "arguments": {...}}
-                    if isinstance(item, dict) and "tool" in item:
-                        tool_calls.append(item)
-                return tool_calls
-            
-            return []
+            return self._finalize_parsed_array(_json_loads(json_str))
         except json.JSONDecodeError:
             # Try to fix common JSON issues
             try:
-                json_str = re.sub(r',\s*}', '}', json_str)
-                json_str = re.sub(r',\s*]', ']', json_str)
-                parsed = json.loads(json_str)
-                if isinstance(parsed, list):
-                    # NEW: Handle case where the entire array IS in format ["tool_name", {...}]
-                    # This happens when LLM uses simplified format: ["e_device_control", {...}]
-                    if len(parsed) == 2 and isinstance(parsed[0], str) and isinstance(parsed[1], dict):
-                        tool_name = parsed[0]
-                        args = parsed[1]
-                        # Validate it's a known tool name
-                        if tool_name in ["e_device_control", "chat_message", "schedule_modifier", "rag_query"]:
-                            return [{"tool": tool_name, "arguments": args}]
-                    
-                    # Filter out empty strings, None, and invalid entries
-                    parsed = [item for item in parsed if item and item != "" and item != [] and item != {}]
-                    
-                    tool_calls = []
-                    for item in parsed:
-                        # Skip None or invalid types
-                        if not item or not isinstance(item, (dict, list, str)):
-                            continue
-                        
-                        # Handle alternative format: ["tool_name", {...}]
-                        if isinstance(item, list) and len(item) == 2:
-                            tool_name = item[0]
-                            args = item[1]
-                            if isinstance(tool_name, str) and isinstance(args, dict):
-                                tool_calls.append({"tool": tool_name, "arguments": args})
-                                continue
-                        
-                        # Handle standard format: {"tool": "...", "arguments": {...}}
-                        if isinstance(item, dict) and "tool" in item:
-                            tool_calls.append(item)
-                    return tool_calls
+                if try_repair:
+                    # Covers trailing commas, unquoted keys and unbalanced brackets in one pass
+                    json_str = self._try_repair_json(json_str)
+                else:
+                    json_str = _RE_TRAILING_COMMA.sub(r'\1', json_str)
+                return self._finalize_parsed_array(_json_loads(json_str))
             except:
                 pass
             
@@ -1453,39 +1688,31 @@ IMPORTANT:
         recent_messages = chat_history[-4:] if len(chat_history) >= 4 else chat_history
         
         # Look for pattern: assistant asks question, user responds
-        for i in range(len(recent_messages) - 1):
-            if i + 1 >= len(recent_messages):
-                break
-                
-            assistant_msg = recent_messages[i]
-            user_msg = recent_messages[i + 1]
+        for assistant_msg, user_msg in zip(recent_messages, recent_messages[1:]):
             
             # Check if assistant message contains a question about controlling a device
             if (assistant_msg.get('role') == 'assistant' and 
                 user_msg.get('role') == 'user'):
                 
-                assistant_content = assistant_msg.get('content', '').lower()
-                user_content = user_msg.get('content', '').lower()
+                assistant_content = assistant_msg.get('content', '')
+                user_content = user_msg.get('content', '')
                 
                 # Check if assistant asked about controlling a device
-                question_keywords = ['would you like', 'do you want', 'should i', 'can i', 'turn on', 'turn off']
-                is_question = any(keyword in assistant_content for keyword in question_keywords)
+                is_question = _RE_QUESTION.search(assistant_content) is not None
                 
                 # Check if user gave a positive response
-                positive_responses = ['yeah', 'yes', 'yep', 'sure', 'okay', 'ok', 'please', 'do it']
-                is_positive = any(response in user_content for response in positive_responses)
+                is_positive = _RE_POSITIVE.search(user_content) is not None
                 
                 # Check if user gave a negative response
-                negative_responses = ['no', 'nope', "don't", 'dont', 'not', "won't"]
-                is_negative = any(response in user_content for response in negative_responses)
+                is_negative = _RE_NEGATIVE.search(user_content) is not None
                 
                 if is_question:
                     if is_positive:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nACTION REQUIRED: User said yes/yeah/sure - you should TAKE ACTION (use e_device_control), NOT ask again."
+                        return _TMPL_QUESTION_POSITIVE.format(question=assistant_content[:100], response=user_content)
                     elif is_negative:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nIMPORTANT: User said no - acknowledge and move on, DO NOT ask the same question again."
+                        return _TMPL_QUESTION_NEGATIVE.format(question=assistant_content[:100], response=user_content)
                     else:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nIMPORTANT: You already asked this question. If user's response is unclear, ask for clarification ONCE, then act. Do NOT repeat the same question."
+                        return _TMPL_QUESTION_UNCLEAR.format(question=assistant_content[:100], response=user_content)
         
         return ""
     
@@ -1506,27 +1733,21 @@ IMPORTANT:
         recent_messages = chat_history[-6:] if len(chat_history) >= 6 else chat_history
         
         # Look for pattern: assistant asks clarification, user provides short response
-        for i in range(len(recent_messages) - 1):
-            if i + 1 >= len(recent_messages):
-                break
-            
-            assistant_msg = recent_messages[i]
-            user_msg = recent_messages[i + 1]
+        # Scan from END (most recent) to BEGINNING (oldest), same as the optimized variant
+        # lookback_end: negative chat_history index just before the current assistant message
+        lookback_end = -1
+        for assistant_msg, user_msg in reversed(list(zip(recent_messages, recent_messages[1:]))):
+            lookback_end -= 1
             
             # Check if assistant asked for clarification
             if (assistant_msg.get('role') == 'assistant' and 
                 user_msg.get('role') == 'user'):
                 
-                assistant_content = assistant_msg.get('content', '').lower()
+                assistant_content = assistant_msg.get('content', '')
                 user_content = user_msg.get('content', '').strip()
                 
                 # Check if assistant asked for clarification
-                clarification_keywords = [
-                    'clarify', 'clarification', 'which', 'what do you mean', 
-                    'specify', 'could you', 'please specify', 'do you mean',
-                    'all devices in the house', 'current location', 'which room'
-                ]
-                is_clarification = any(keyword in assistant_content for keyword in clarification_keywords)
+                is_clarification = _RE_CLARIFY.search(assistant_content) is not None
                 
                 if is_clarification:
                     # Check if user response is a single word/phrase (likely providing missing info)
@@ -1535,18 +1756,15 @@ IMPORTANT:
                     
                     # If user response is short (1-3 words), likely providing missing information
                     if len(user_words) <= 3 and len(user_content) < 50:
-                        # Look back further for original request (6-10 messages back)
+                        # Look back further for original request (6-10 messages back),
+                        # walking backwards from just before the clarification exchange
                         original_request = None
-                        for j in range(max(0, len(chat_history) - 10), len(chat_history) - len(recent_messages) + i):
-                            if j < 0 or j >= len(chat_history):
-                                continue
-                            msg = chat_history[j]
+                        for msg in reversed(chat_history[-10:lookback_end]):
                             if msg.get('role') == 'user':
-                                content = msg.get('content', '').lower()
+                                content = msg.get('content', '')
                                 # Check if it's an action request
-                                action_keywords = ['turn', 'switch', 'add', 'delete', 'change', 'schedule', 'everything', 'all devices']
-                                if any(keyword in content for keyword in action_keywords):
-                                    original_request = msg.get('content', '')
+                                if _RE_ACTION_REQUEST.search(content):
+                                    original_request = content
                                     break
                         
                         if original_request:
@@ -1554,28 +1772,25 @@ IMPORTANT:
                             info_type = None
                             info_value = user_content
                             
+                            user_content_lower = user_content.lower()
+                            
                             # Check if it's a room name
-                            rooms = ['bedroom', 'bathroom', 'kitchen', 'living room', 'living']
-                            if user_content.lower() in rooms:
+                            if user_content_lower in _ROOM_ANSWERS:
                                 info_type = 'room'
                                 # Normalize room name
-                                if user_content.lower() == 'living':
+                                if user_content_lower == 'living':
                                     info_value = 'Living Room'
                                 else:
                                     info_value = user_content.title()
                             
                             # Check if it's a device name
-                            elif user_content.lower() in ['light', 'ac', 'tv', 'fan', 'alarm', 'lgiht', 'ligth']:
+                            elif user_content_lower in _DEVICE_ANSWERS:
                                 info_type = 'device'
                                 # Normalize device name
-                                device_map = {
-                                    'light': 'Light', 'lgiht': 'Light', 'ligth': 'Light',
-                                    'ac': 'AC', 'tv': 'TV', 'fan': 'Fan', 'alarm': 'Alarm'
-                                }
-                                info_value = device_map.get(user_content.lower(), user_content.title())
+                                info_value = _DEVICE_ANSWERS[user_content_lower]
                             
                             # Check if it's a time (HH:MM format or similar)
-                            elif re.match(r'^\d{1,2}[:.]?\d{0,2}$', user_content):
+                            elif _RE_BARE_TIME.match(user_content):
                                 info_type = 'time'
                             
                             # Check if it's an activity name (longer phrase)
@@ -1585,7 +1800,7 @@ IMPORTANT:
                             # If we identified the info type, return completion context
                             if info_type:
                                 return f"""COMPLETE PREVIOUS ACTION:
-You previously asked for clarification: "{assistant_msg.get('content', '')[:150]}..."
+You previously asked for clarification: "{assistant_content[:150]}..."
 User just provided {info_type}="{info_value}" in response.
 
 ORIGINAL REQUEST: "{original_request}"
@@ -1610,35 +1825,7 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
         
         json_str = json_str.strip()
         
-        # Count opening and closing braces/brackets
-        open_braces = json_str.count('{')
-        close_braces = json_str.count('}')
-        open_brackets = json_str.count('[')
-        close_brackets = json_str.count(']')
-        
-        # If it looks like an incomplete JSON object
-        if json_str.startswith('{') and open_braces > close_braces:
-            # Try to complete it
-            missing_braces = open_braces - close_braces
-            # Check if it's inside an array context
-            if json_str.startswith('[') or '[' in json_str[:10]:
-                # It's an array, need to close object then array
-                json_str += '}' * missing_braces
-                if open_brackets > close_brackets:
-                    json_str += ']' * (open_brackets - close_brackets)
-            else:
-                # Just an object
-                json_str += '}' * missing_braces
-        
-        # If it looks like an incomplete JSON array
-        elif json_str.startswith('[') and open_brackets > close_brackets:
-            missing_brackets = open_brackets - close_brackets
-            # Close any open objects first
-            if open_braces > close_braces:
-                json_str += '}' * (open_braces - close_braces)
-            json_str += ']' * missing_brackets
-        
-        return json_str
+        return _balance_brackets(json_str)
     
     def _parse_json_safely(self, json_str: str) -> dict:
         """
@@ -1658,7 +1845,7 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
             json_str = json_str.strip()
             
             # Try to parse
-            parsed = json.loads(json_str)
+            parsed = _json_loads(json_str)
             
             # Validate structure
             if isinstance(parsed, dict):
@@ -1675,11 +1862,10 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
             # Try to fix common JSON issues
             try:
                 # Remove trailing commas
-                json_str = re.sub(r',\s*}', '}', json_str)
-                json_str = re.sub(r',\s*]', ']', json_str)
+                json_str = _RE_TRAILING_COMMA.sub(r'\1', json_str)
                 
                 # Try parsing again
-                parsed = json.loads(json_str)
+                parsed = _json_loads(json_str)
                 if isinstance(parsed, dict) and "tool" in parsed:
                     return parsed
             except:
@@ -1703,22 +1889,19 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
         if not text:
             return False
         
-        text_lower = text.lower().strip()
+        # Every pattern below needs a quoted "tool" key - bail out early without it
+        if _RE_TOOL_KEY.search(text) is None:
+            return False
         
         # Check for common JSON tool call patterns
         # Pattern 1: Contains "tool" and "arguments" keywords
-        if '"tool"' in text_lower or "'tool'" in text_lower:
-            if '"arguments"' in text_lower or "'arguments'" in text_lower:
-                # Also check for JSON structure markers
-                if ('{' in text or '[' in text):
-                    return True
-        
-        # Pattern 2: Looks like JSON array with tool calls
-        if text.strip().startswith('[') and '"tool"' in text_lower:
-            return True
+        if _RE_ARGUMENTS_KEY.search(text) is not None:
+            # Also check for JSON structure markers
+            if ('{' in text or '[' in text):
+                return True
         
-        # Pattern 3: Looks like JSON object with tool call
-        if text.strip().startswith('{') and '"tool"' in text_lower:
+        # Pattern 2/3: Looks like JSON array or object with tool call(s)
+        if text.lstrip()[:1] in ('[', '{') and _RE_TOOL_KEY_DOUBLE_QUOTED.search(text) is not None:
             return True
         
         return False
@@ -1739,35 +1922,25 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
         
         # Look for pattern: assistant asks question, user responds
         # Scan from END (most recent) to BEGINNING (oldest) to prioritize latest interactions
-        for i in range(len(recent_messages) - 2, -1, -1):  # Reverse iteration: start from second-to-last, go backwards
-            if i + 1 >= len(recent_messages):
-                continue
-                
-            assistant_msg = recent_messages[i]
-            user_msg = recent_messages[i + 1]
+        for assistant_msg, user_msg in reversed(list(zip(recent_messages, recent_messages[1:]))):
             
             if (assistant_msg.get('role') == 'assistant' and 
                 user_msg.get('role') == 'user'):
                 
-                assistant_content = assistant_msg.get('content', '').lower()
-                user_content = user_msg.get('content', '').lower()
-                
-                question_keywords = ['would you like', 'do you want', 'should i', 'can i', 'turn on', 'turn off']
-                is_question = any(keyword in assistant_content for keyword in question_keywords)
+                assistant_content = assistant_msg.get('content', '')
+                user_content = user_msg.get('content', '')
                 
-                positive_responses = ['yeah', 'yes', 'yep', 'sure', 'okay', 'ok', 'please', 'do it']
-                is_positive = any(response in user_content for response in positive_responses)
-                
-                negative_responses = ['no', 'nope', "don't", 'dont', 'not', "won't"]
-                is_negative = any(response in user_content for response in negative_responses)
+                is_question = _RE_QUESTION.search(assistant_content) is not None
+                is_positive = _RE_POSITIVE.search(user_content) is not None
+                is_negative = _RE_NEGATIVE.search(user_content) is not None
                 
                 if is_question:
                     if is_positive:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nACTION REQUIRED: User said yes/yeah/sure - you should TAKE ACTION (use e_device_control), NOT ask again."
+                        return _TMPL_QUESTION_POSITIVE.format(question=assistant_content[:100], response=user_content)
                     elif is_negative:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nIMPORTANT: User said no - acknowledge and move on, DO NOT ask the same question again."
+                        return _TMPL_QUESTION_NEGATIVE.format(question=assistant_content[:100], response=user_content)
                     else:
-                        return f"You recently asked: \"{assistant_msg.get('content', '')[:100]}...\"\nUser responded: \"{user_msg.get('content', '')}\"\nIMPORTANT: You already asked this question. If user's response is unclear, ask for clarification ONCE, then act. Do NOT repeat the same question."
+                        return _TMPL_QUESTION_UNCLEAR.format(question=assistant_content[:100], response=user_content)
         
         return ""
     
@@ -1788,25 +1961,15 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
         
         # Look for pattern: assistant asks clarification, user provides short response
         # Scan from END (most recent) to BEGINNING (oldest) to prioritize latest interactions
-        for i in range(len(recent_messages) - 2, -1, -1):  # Reverse iteration: start from second-to-last, go backwards
-            if i + 1 >= len(recent_messages):
-                continue
-            
-            assistant_msg = recent_messages[i]
-            user_msg = recent_messages[i + 1]
+        for assistant_msg, user_msg in reversed(list(zip(recent_messages, recent_messages[1:]))):
             
             if (assistant_msg.get('role') == 'assistant' and 
                 user_msg.get('role') == 'user'):
                 
-                assistant_content = assistant_msg.get('content', '').lower()
+                assistant_content = assistant_msg.get('content', '')
                 user_content = user_msg.get('content', '').strip()
                 
-                clarification_keywords = [
-                    'clarify', 'clarification', 'which', 'what do you mean', 
-                    'specify', 'could you', 'please specify', 'do you mean',
-                    'all devices in the house', 'current location', 'which room'
-                ]
-                is_clarification = any(keyword in assistant_content for keyword in clarification_keywords)
+                is_clarification = _RE_CLARIFY.search(assistant_content) is not None
                 
                 if is_clarification:
                     user_words = user_content.split()
@@ -1814,27 +1977,23 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
                         info_type = None
                         info_value = user_content
                         
+                        user_content_lower = user_content.lower()
+                        
                         # Check if it's a room name
-                        rooms = ['bedroom', 'bathroom', 'kitchen', 'living room', 'living']
-                        if user_content.lower() in rooms:
+                        if user_content_lower in _ROOM_ANSWERS:
                             info_type = 'room'
-                            if user_content.lower() == 'living':
+                            if user_content_lower == 'living':
                                 info_value = 'Living Room'
                             else:
                                 info_value = user_content.title()
                         
                         # Check if it's a device name
-                        devices = ['light', 'ac', 'tv', 'fan', 'alarm', 'lgiht', 'ligth']
-                        if user_content.lower() in devices:
+                        if user_content_lower in _DEVICE_ANSWERS:
                             info_type = 'device'
-                            device_map = {
-                                'light': 'Light', 'lgiht': 'Light', 'ligth': 'Light',
-                                'ac': 'AC', 'tv': 'TV', 'fan': 'Fan', 'alarm': 'Alarm'
-                            }
-                            info_value = device_map.get(user_content.lower(), user_content.title())
+                            info_value = _DEVICE_ANSWERS[user_content_lower]
                         
                         # Check if it's a time
-                        if re.match(r'^\d{1,2}[:.]?\d{0,2}$', user_content):
+                        if _RE_BARE_TIME.match(user_content):
                             info_type = 'time'
                         
                         # Check if it's an activity name
@@ -1842,30 +2001,46 @@ Do NOT ask for clarification again. Do NOT just list information - TAKE ACTION i
                             info_type = 'activity'
                         
                         if info_type:
-                            # Look back for original request (up to 10 messages back)
+                            # Look back for original request (up to 10 messages back),
+                            # newest first so the most recent matching request wins
                             original_request_msg = None
-                            start_idx = max(0, len(full_chat_history) - 10)
-                            for j in range(start_idx, len(full_chat_history)):
-                                if j < 0 or j >= len(full_chat_history):
+                            for msg in reversed(full_chat_history[-10:]):
+                                if msg.get('role') != 'user':
                                     continue
-                                msg = full_chat_history[j]
-                                if msg.get('role') == 'user':
-                                    content = msg.get('content', '').lower()
-                                    action_keywords = ['turn', 'switch', 'add', 'delete', 'change', 'schedule', 'everything', 'all devices']
-                                    if any(keyword in content for keyword in action_keywords):
-                                        original_request_msg = full_chat_history[j]
-                                        break
+                                if _RE_ACTION_REQUEST.search(msg.get('content', '')):
+                                    original_request_msg = msg
+                                    break
                             
                             if original_request_msg:
                                 original_request_content = original_request_msg.get('content', '')
                                 return f"""COMPLETE PREVIOUS ACTION:
-You previously asked for clarification: "{assistant_msg.get('content', '')[:150]}..."
+You previously asked for clarification: "{assistant_content[:150]}..."
 User just provided {info_type}="{info_value}" in response.
 Original request was: "{original_request_content[:150]}..."
 ACTION REQUIRED: Combine the original request with the provided information and execute the action immediately. Do NOT ask for clarification again."""
         
         return ""
     
+    def summarize_conversation_async(self, old_messages: list, existing_summary: dict = None) -> Future:
+        """
+        Run summarize_conversation on the client's background summarization worker.
+        (Phase 3.1: Background Summarization)
+        
+        A single long-lived worker thread is reused across turns instead of creating a
+        new thread pool per trigger, and summaries are produced in submission order.
+        
+        Args:
+            old_messages: List of messages to summarize (beyond recent window)
+            existing_summary: Existing summary dict to merge with
+            
+        Returns:
+            Future resolving to the summary dict returned by summarize_conversation
+        """
+        # Initialize executor if it doesn't exist (for instances created before this optimization)
+        if not hasattr(self, '_summary_executor'):
+            self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarize")
+        return self._summary_executor.submit(self.summarize_conversation, old_messages, existing_summary)
+    
     def summarize_conversation(self, old_messages: list, existing_summary: dict = None) -> dict:
         """
         Summarize old conversation messages to compress context.
@@ -1892,37 +2067,41 @@ ACTION REQUIRED: Combine the original request with the provided information and
         # Extract key events (device controls, schedule changes, preferences)
         key_events = []
         for msg in old_messages:
-            content = msg.get('content', '').lower()
-            role = msg.get('role', '')
-            
-            # Extract device control events
-            if 'turned' in content or 'turned on' in content or 'turned off' in content:
-                key_events.append({
-                    "type": "device_control",
-                    "summary": msg.get('content', '')[:100]
-                })
-            # Extract schedule changes
-            elif any(word in content for word in ['schedule', 'appointment', 'meeting', 'added', 'changed', 'deleted']):
-                key_events.append({
-                    "type": "schedule_change",
-                    "summary": msg.get('content', '')[:100]
-                })
-            # Extract preferences
-            elif 'preference' in content or 'keep it on' in content:
-                key_events.append({
-                    "type": "preference_set",
-                    "summary": msg.get('content', '')[:100]
-                })
+            content = msg.get('content', '')
+            
+            # Classify in one scan; when several event kinds appear, device control wins,
+            # then schedule change, then preference (same precedence as before).
+            # A device-control hit can't be outranked, so the scan stops there
+            found = set()
+            for match in _RE_KEY_EVENT.finditer(content):
+                found.add(match.lastgroup)
+                if match.lastgroup == _KEY_EVENT_PRIORITY[0]:
+                    break
+            for event_type in _KEY_EVENT_PRIORITY:
+                if event_type in found:
+                    key_events.append({
+                        "type": event_type,
+                        "summary": content[:100]
+                    })
+                    break
         
         # Format messages for summarization
-        conversation_text = ""
+        # Collect lines and join once - repeated += would copy the growing text per message.
+        # Only the first _SUMMARY_TRANSCRIPT_CHARS characters reach the prompt, so stop early
+        conversation_lines = []
+        conversation_length = 0
         for msg in old_messages:
-            role = msg.get('role', 'unknown')
-            content = msg.get('content', '')
             # Skip notifications and preference updates in summary
             if msg.get('is_notification') or msg.get('is_preference_update'):
                 continue
-            conversation_text += f"{role.upper()}: {content}\n"
+            role = msg.get('role', 'unknown')
+            content = msg.get('content', '')
+            line = f"{role.upper()}: {content}\n"
+            conversation_lines.append(line)
+            conversation_length += len(line)
+            if conversation_length >= _SUMMARY_TRANSCRIPT_CHARS:
+                break
+        conversation_text = "".join(conversation_lines)
         
         if not conversation_text.strip():
             # No meaningful content to summarize
@@ -1933,28 +2112,43 @@ ACTION REQUIRED: Combine the original request with the provided information and
             }
         
         # Generate summary using LLM (compact prompt)
-        summary_prompt = f"""Summarize this conversation focusing on:
-- User preferences and important decisions
-- Device control patterns
-- Schedule changes
-- Key information the user shared
-
-Conversation:
-{conversation_text[:2000]}
-
-Provide a concise summary (max 200 words):"""
+        summary_prompt = _SUMMARY_PROMPT_HEAD + conversation_text[:_SUMMARY_TRANSCRIPT_CHARS] + _SUMMARY_PROMPT_TAIL
+        
+        # Summaries of an identical transcript are reused instead of re-running the LLM call.
+        # Initialize cache if it doesn't exist (for instances created before this optimization)
+        # Summarization runs in background threads, so cache access is guarded by a lock
+        if not hasattr(self, '_summary_cache'):
+            self._summary_cache = LRUCache(maxsize=128)
+            self._summary_cache_lock = threading.Lock()
+        summary_cache_key = (self.model, summary_prompt)
         
         try:
-            response = self.client.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": summary_prompt}],
-                options={
-                    "temperature": 0.3,  # Lower temperature for more factual summaries
-                    "num_ctx": 4096,  # Smaller context for summarization
-                    "num_predict": 300  # Limit summary length
-                }
-            )
-            summary_text = response.get('message', {}).get('content', '').strip()
+            with self._summary_cache_lock:
+                summary_text = self._summary_cache.get(summary_cache_key)
+            if summary_text is None:
+                # Size the context window to the prompt (~4 chars/token) plus the summary budget
+                approx_tokens = len(summary_prompt) // 4 + _SUMMARY_NUM_PREDICT
+                if approx_tokens <= 1024:
+                    num_ctx = 1024
+                elif approx_tokens <= 2048:
+                    num_ctx = 2048
+                else:
+                    num_ctx = 4096
+                response = self.client.chat(
+                    model=self.model,
+                    messages=[{"role": "user", "content": summary_prompt}],
+                    options={
+                        "temperature": 0.3,  # Lower temperature for more factual summaries
+                        "num_ctx": num_ctx,  # Smaller context for summarization
+                        "num_predict": _SUMMARY_NUM_PREDICT  # Limit summary length
+                    }
+                )
+                summary_text = response.get('message', {}).get('content', '').strip()
+                # Only successful LLM summaries are cached (fallback text below is not)
+                with self._summary_cache_lock:
+                    self._summary_cache[summary_cache_key] = summary_text
+            else:
+                print("[CONTEXT] Reusing cached summary for identical transcript")
         except Exception as e:
             print(f"[CONTEXT] Summarization failed: {e}")
             # Fallback: create simple summary from key events
@@ -1963,13 +2157,14 @@ Provide a concise summary (max 200 words):"""
         # Merge with existing summary
         if existing_summary and existing_summary.get("summary_text"):
             combined_summary = f"{existing_summary['summary_text']}\n\n{summary_text}"
-            combined_events = existing_summary.get("key_events", []) + key_events
+            # Bounded deque keeps only the last 20 events without building the full concatenation
+            combined_events = deque(chain(existing_summary.get("key_events", []), key_events), maxlen=20)
         else:
             combined_summary = summary_text
-            combined_events = key_events
+            combined_events = deque(key_events, maxlen=20)
         
         return {
             "last_summarized_turn": existing_summary.get("last_summarized_turn", 0) if existing_summary else 0,
             "summary_text": combined_summary[:500],  # Limit summary size
-            "key_events": combined_events[-20:]  # Keep last 20 key events
+            "key_events": list(combined_events)  # Keep last 20 key events
         }
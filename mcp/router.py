@@ -2,11 +2,97 @@
 MCP Execution Router - dispatches LLM tool calls to MCP server tools.
 """
 
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from mcp.server import MCPServer
-from core.state import StateManager
+from core.state import StateManager, STATE_CACHE_TTL
 from utils.safety_logger import log_tool_call, log_rejected_action, log_reminder_prevented
 
 
+logger = logging.getLogger(__name__)
+
+
+# Tools that only read state - consecutive calls to these can run concurrently
+_CONCURRENT_SAFE_TOOLS = frozenset({"rag_query"})
+# Worker threads kept by each router for concurrent batch dispatch
+_BATCH_WORKERS = 4
+# Identical failing calls in a row before the router stops dispatching them (loop breaker)
+_REPEATED_FAILURE_LIMIT = 3
+
+# Static rejection results for malformed LLM responses (copied before returning - callers may mutate results)
+_ERR_RESPONSE_NOT_DICT = {
+    "success": False,
+    "error": "LLM response must be a dictionary",
+    "tool": None
+}
+_ERR_MISSING_TOOL = {
+    "success": False,
+    "error": "Missing 'tool' field in LLM response",
+    "tool": None
+}
+
+# Keywords that indicate "leave it on" / "don't notify", matched in a single regex pass
+_LEAVE_IT_ON_KEYWORDS = (
+    "leave it on",
+    "leave it",
+    "that's fine",
+    "thats fine",
+    "it's fine",
+    "its fine",
+    "that's okay",
+    "thats okay",
+    "it's okay",
+    "its okay",
+    "don't worry",
+    "dont worry",
+    "no problem",
+    "it's intentional",
+    "its intentional",
+    "keep it on",
+    "keep on"
+)
+_RE_LEAVE_IT_ON = re.compile("|".join(re.escape(keyword) for keyword in _LEAVE_IT_ON_KEYWORDS))
+
+
+@lru_cache(maxsize=8)
+def _do_not_remind_matcher(items: tuple) -> tuple:
+    """
+    Build (and cache per list contents) a single-pass matcher for do_not_remind items.
+    
+    Args:
+        items: do_not_remind items as a tuple (hashable cache key)
+        
+    Returns:
+        Tuple of (compiled alternation of lower-cased items or None if empty, lower-cased items)
+    """
+    lowered = tuple(item.lower() for item in items)
+    pattern = re.compile("|".join(re.escape(item) for item in lowered)) if lowered else None
+    return pattern, lowered
+
+
+def _call_fingerprint(tool_name: str, arguments: dict, user_message: str = None) -> tuple:
+    """
+    Build a hashable fingerprint of a tool call for repeated-failure detection.
+    
+    Args:
+        tool_name: Name of the tool being called
+        arguments: Tool arguments
+        user_message: Originating user message (scopes detection to one user turn)
+        
+    Returns:
+        Tuple of (tool_name, arguments key, user_message)
+    """
+    try:
+        return tool_name, frozenset(arguments.items()), user_message
+    except TypeError:
+        # Unhashable argument values (lists, dicts) - fall back to a stable repr
+        return tool_name, repr(sorted(arguments.items(), key=lambda item: str(item[0]))), user_message
+
+
 class MCPRouter:
     """
     Routes LLM tool calls to the appropriate MCP server tools.
@@ -27,13 +113,47 @@ class MCPRouter:
         """
         self.mcp_server = mcp_server
         
-        # Tool name mapping
+        # Tool name mapping: tool -> (handler, whether it takes user_message)
         self._tool_map = {
-            "chat_message": self._route_chat_message,
-            "e_device_control": self._route_e_device_control,
-            "schedule_modifier": self._route_schedule_modifier,
-            "rag_query": self._route_rag_query,
+            "chat_message": (self._route_chat_message, False),
+            "e_device_control": (self._route_e_device_control, False),
+            "schedule_modifier": (self._route_schedule_modifier, True),
+            "rag_query": (self._route_rag_query, False),
         }
+        # Formatted once for the unknown-tool error message
+        self._tool_names_repr = repr(list(self._tool_map.keys()))
+        
+        # do_not_remind list cached against the state revision, for at most STATE_CACHE_TTL seconds
+        # (other sessions may write the shared database without bumping this revision)
+        self._dnr_revision = None
+        self._dnr_expires = 0.0
+        self._dnr_list = []
+        self._dnr_set = frozenset()
+        self._dnr_matcher = (None, ())
+        
+        # Fingerprints of recent consecutive failed calls (cleared on any success)
+        self._recent_failures = deque(maxlen=8)
+    
+    def _get_do_not_remind(self, state_manager: StateManager) -> list:
+        """
+        Get the do_not_remind list, reusing the cached copy while the state revision is unchanged
+        and the copy is younger than STATE_CACHE_TTL.
+        
+        Args:
+            state_manager: StateManager whose do_not_remind list is needed
+            
+        Returns:
+            List of items that should not be reminded about
+        """
+        revision = (id(state_manager), state_manager.revision)
+        now = time.monotonic()
+        if revision != self._dnr_revision or now >= self._dnr_expires:
+            self._dnr_list = state_manager.get_do_not_remind()
+            self._dnr_set = frozenset(self._dnr_list)
+            self._dnr_matcher = _do_not_remind_matcher(tuple(self._dnr_list))
+            self._dnr_revision = revision
+            self._dnr_expires = now + STATE_CACHE_TTL
+        return self._dnr_list
     
     def execute(self, llm_response: dict, user_message: str = None) -> dict:
         """
@@ -51,11 +171,7 @@ class MCPRouter:
         """
         # Validate input format
         if not isinstance(llm_response, dict):
-            result = {
-                "success": False,
-                "error": "LLM response must be a dictionary",
-                "tool": None
-            }
+            result = _ERR_RESPONSE_NOT_DICT.copy()
             log_rejected_action("Invalid LLM response format (not a dictionary)")
             return result
         
@@ -63,11 +179,7 @@ class MCPRouter:
         arguments = llm_response.get("arguments", {})
         
         if not tool_name:
-            result = {
-                "success": False,
-                "error": "Missing 'tool' field in LLM response",
-                "tool": None
-            }
+            result = _ERR_MISSING_TOOL.copy()
             log_rejected_action("Missing 'tool' field in LLM response")
             return result
         
@@ -80,33 +192,55 @@ class MCPRouter:
             log_rejected_action("Invalid arguments format (not a dictionary)", tool_name, arguments)
             return result
         
-        # Route to appropriate tool handler
-        if tool_name not in self._tool_map:
+        # Route to appropriate tool handler (single dict lookup)
+        tool_entry = self._tool_map.get(tool_name)
+        if tool_entry is None:
             result = {
                 "success": False,
-                "error": f"Unknown tool: '{tool_name}'. Available tools: {list(self._tool_map.keys())}",
+                "error": f"Unknown tool: '{tool_name}'. Available tools: {self._tool_names_repr}",
                 "tool": tool_name
             }
             log_rejected_action(f"Unknown tool: '{tool_name}'", tool_name, arguments)
             return result
         
+        # Circuit breaker: stop re-running a call that just failed identically several times
+        # in a row, so a retry loop can't keep growing the conversation
+        fingerprint = _call_fingerprint(tool_name, arguments, user_message)
+        recent_failures = self._recent_failures
+        if (len(recent_failures) >= _REPEATED_FAILURE_LIMIT
+                and all(entry == fingerprint for entry in list(recent_failures)[-_REPEATED_FAILURE_LIMIT:])):
+            result = {
+                "success": False,
+                "error": f"loop_detected: aborting after {_REPEATED_FAILURE_LIMIT} repeated failures",
+                "tool": tool_name
+            }
+            log_rejected_action(f"Repeated failing call to '{tool_name}' (loop detected)", tool_name, arguments)
+            return result
+        
         try:
-            handler = self._tool_map[tool_name]
-            print(f"[ROUTER DEBUG] Routing tool '{tool_name}' with arguments: {arguments}")
+            # Lazy %-formatting: arguments/result are only repr'd when DEBUG is enabled
+            logger.debug("Routing tool %r with arguments: %r", tool_name, arguments)
             
-            # Pass user_message to schedule_modifier handler
-            if tool_name == "schedule_modifier":
+            # Pass user_message to handlers that use it (schedule_modifier)
+            handler, needs_user_message = tool_entry
+            if needs_user_message:
                 result = handler(arguments, user_message=user_message)
             else:
                 result = handler(arguments)
             
-            print(f"[ROUTER DEBUG] Tool '{tool_name}' result: success={result.get('success')}, error={result.get('error')}")
-            if result.get("success"):
-                print(f"[ROUTER DEBUG] Tool '{tool_name}' result details: {result}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Tool %r result: success=%s, error=%s", tool_name, result.get("success"), result.get("error"))
+                if result.get("success"):
+                    logger.debug("Tool %r result details: %r", tool_name, result)
             
             # Log every tool call
             log_tool_call(tool_name, arguments, result.get("success", False), result)
             
+            if result.get("success"):
+                recent_failures.clear()
+            else:
+                recent_failures.append(fingerprint)
+            
             return result
         except Exception as e:
             result = {
@@ -115,8 +249,78 @@ class MCPRouter:
                 "tool": tool_name
             }
             log_rejected_action(f"Tool execution error: {str(e)}", tool_name, arguments)
+            recent_failures.append(fingerprint)
             return result
     
+    def execute_batch(self, llm_responses: list, user_message: str = None) -> list:
+        """
+        Execute multiple tool calls from one LLM response, preserving their order.
+        
+        Consecutive read-only calls (rag_query) are dispatched concurrently. Every other
+        tool mutates shared state (devices, schedule) and runs on its own, in order, so
+        rules like "delete before add in the same time slot" still hold.
+        
+        Args:
+            llm_responses: List of dicts, each with format:
+                {
+                    "tool": str,  # Tool name
+                    "arguments": dict  # Tool arguments
+                }
+            user_message: Original user message (passed to schedule_modifier)
+        
+        Returns:
+            list: Tool execution results, in the same order as llm_responses
+        """
+        results = [None] * len(llm_responses)
+        pending = []  # Indices of the current run of concurrent-safe calls
+        
+        def flush_pending():
+            if len(pending) == 1:
+                results[pending[0]] = self.execute(llm_responses[pending[0]], user_message=user_message)
+            elif pending:
+                logger.debug("Dispatching %d read-only tool calls concurrently", len(pending))
+                executor = self._get_batch_executor()
+                futures = {
+                    index: executor.submit(self.execute, llm_responses[index], user_message)
+                    for index in pending
+                }
+                # execute() reports errors in its result dict, so result() does not raise
+                for index, future in futures.items():
+                    results[index] = future.result()
+            pending.clear()
+        
+        for index, llm_response in enumerate(llm_responses):
+            if isinstance(llm_response, dict) and llm_response.get("tool") in _CONCURRENT_SAFE_TOOLS:
+                pending.append(index)
+                continue
+            flush_pending()
+            results[index] = self.execute(llm_response, user_message=user_message)
+        flush_pending()
+        
+        return results
+    
+    def _get_batch_executor(self) -> ThreadPoolExecutor:
+        """
+        Get the router's long-lived worker pool for concurrent batch dispatch.
+        
+        Created on first use and reused across batches, so concurrent dispatch doesn't
+        spin up (and tear down) new threads every turn.
+        
+        Returns:
+            ThreadPoolExecutor shared by this router's execute_batch calls
+        """
+        # Initialize executor if it doesn't exist (also covers routers created before this existed)
+        if getattr(self, '_batch_executor', None) is None:
+            self._batch_executor = ThreadPoolExecutor(max_workers=_BATCH_WORKERS, thread_name_prefix="mcp-router")
+        return self._batch_executor
+    
+    def close(self) -> None:
+        """Shut down the batch worker pool (a later execute_batch call recreates it)."""
+        executor = getattr(self, '_batch_executor', None)
+        if executor is not None:
+            self._batch_executor = None
+            executor.shutdown(wait=False)
+    
     def _route_chat_message(self, arguments: dict) -> dict:
         """Route chat_message tool call with reminder prevention."""
         message = arguments.get("message")
@@ -133,10 +337,10 @@ class MCPRouter:
         message_lower = message.lower().strip()
         
         # Check do_not_remind list - check both exact match and if message contains any item
-        do_not_remind_list = state_manager.get_do_not_remind()
+        do_not_remind_list = self._get_do_not_remind(state_manager)
         
-        # Check exact match
-        if message_lower in do_not_remind_list:
+        # Check exact match (O(1) against the set built alongside the cached list)
+        if message_lower in self._dnr_set:
             log_reminder_prevented(message_lower)
             return {
                 "success": False,
@@ -145,16 +349,21 @@ class MCPRouter:
                 "error": f"Reminder prevented: '{message_lower}' is in do_not_remind list"
             }
         
-        # Check if message contains any item from do_not_remind list
-        for item in do_not_remind_list:
-            if item.lower() in message_lower or message_lower in item.lower():
-                log_reminder_prevented(item)
-                return {
-                    "success": False,
-                    "tool": "chat_message",
-                    "message": "",
-                    "error": f"Reminder prevented: '{item}' is in do_not_remind list"
-                }
+        # Check if message contains any item from do_not_remind list (or is part of one).
+        # One regex pass rules out the common no-match case; on a hit, the ordered loop
+        # below picks the same item as before (first in list order)
+        pattern, lowered_items = self._dnr_matcher
+        if ((pattern is not None and pattern.search(message_lower))
+                or any(message_lower in item_lower for item_lower in lowered_items)):
+            for item, item_lower in zip(do_not_remind_list, lowered_items):
+                if item_lower in message_lower or message_lower in item_lower:
+                    log_reminder_prevented(item)
+                    return {
+                        "success": False,
+                        "tool": "chat_message",
+                        "message": "",
+                        "error": f"Reminder prevented: '{item}' is in do_not_remind list"
+                    }
         
         return self.mcp_server.chat_message(message)
     
@@ -164,15 +373,9 @@ class MCPRouter:
         device = arguments.get("device")
         action = arguments.get("action")
         
-        missing = []
-        if room is None:
-            missing.append("room")
-        if device is None:
-            missing.append("device")
-        if action is None:
-            missing.append("action")
-        
-        if missing:
+        # Only build the missing-argument list on the (rare) error path
+        if room is None or device is None or action is None:
+            missing = [name for name, value in (("room", room), ("device", device), ("action", action)) if value is None]
             return {
                 "success": False,
                 "tool": "e_device_control",
@@ -264,29 +467,8 @@ class MCPRouter:
         
         message_lower = user_message.lower().strip()
         
-        # Keywords that indicate "leave it on" / "don't notify"
-        leave_it_on_keywords = [
-            "leave it on",
-            "leave it",
-            "that's fine",
-            "thats fine",
-            "it's fine",
-            "its fine",
-            "that's okay",
-            "thats okay",
-            "it's okay",
-            "its okay",
-            "don't worry",
-            "dont worry",
-            "no problem",
-            "it's intentional",
-            "its intentional",
-            "keep it on",
-            "keep on"
-        ]
-        
         # Check if message contains any "leave it on" keywords
-        contains_leave_it_on = any(keyword in message_lower for keyword in leave_it_on_keywords)
+        contains_leave_it_on = _RE_LEAVE_IT_ON.search(message_lower) is not None
         
         if not contains_leave_it_on:
             return {
@@ -3,12 +3,165 @@ MCP Server implementation with tools for chat and device control.
 No UI dependencies - pure state management and tool execution.
 """
 
-from datetime import datetime
-from core.state import StateManager, _validate_schedule_item
-from config import ROOMS
+import logging
+import re
+import threading
+from bisect import insort
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
+from time import monotonic
+from core.state import StateManager, _validate_schedule_item, time_to_minutes, STATE_CACHE_TTL
+from config import ROOMS, VERIFY_SCHEDULE_WRITES
 from core.activity_derivation import ActivityDerivationService
 
 
+logger = logging.getLogger(__name__)
+
+# Serializes RAG retriever construction (background warm-up vs. first query, concurrent batch queries)
+_RAG_INIT_LOCK = threading.Lock()
+
+
+# Room name variations -> exact room names from ROOMS config
+_ROOM_MAPPING = {
+    "bedroom": "Bedroom",
+    "bathroom": "Bathroom",
+    "kitchen": "Kitchen",
+    "livingroom": "Living Room",
+    "living room": "Living Room",
+    "living": "Living Room"
+}
+# Common device name variations -> exact device names
+_DEVICE_MAPPING = {
+    "light": "Light",
+    "lights": "Light",
+    "lamp": "Light",
+    "lamps": "Light",
+    "ac": "AC",
+    "air conditioner": "AC",
+    "airconditioner": "AC",
+    "air conditioning": "AC",
+    "tv": "TV",
+    "television": "TV",
+    "fan": "Fan",
+    "fans": "Fan",
+    "alarm": "Alarm",
+    "alarms": "Alarm"
+}
+
+# Weekday numbers as returned by datetime.weekday()
+_WEEKDAY_NUMBERS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
+    "friday": 4, "saturday": 5, "sunday": 6
+}
+_RE_NEXT_WEEKDAY = re.compile("next (" + "|".join(_WEEKDAY_NUMBERS) + ")")
+# Month names in calendar order (dict order decides precedence when a message names several)
+_MONTH_NUMBERS = {
+    "january": 1, "february": 2, "march": 3, "april": 4,
+    "may": 5, "june": 6, "july": 7, "august": 8,
+    "september": 9, "october": 10, "november": 11, "december": 12
+}
+_MONTH_ALTERNATION = "|".join(_MONTH_NUMBERS)
+# "March 15th" / "March 15" and "15th March" / "15 March", one pass each over the message
+_RE_MONTH_DAY = re.compile(rf"({_MONTH_ALTERNATION})\s+(\d{{1,2}})(?:st|nd|rd|th)?")
+_RE_DAY_MONTH = re.compile(rf"(\d{{1,2}})(?:st|nd|rd|th)?\s+({_MONTH_ALTERNATION})")
+_RE_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+# Cheap gate for _extract_date_from_message: absolute dates need a digit, relative ones a keyword
+_RE_DATE_HINT = re.compile(r"\d|tomorrow|next")
+
+# Lower-cased room name -> ROOMS key (ROOMS order), for case-insensitive lookups
+_ROOM_CANONICAL = {room.lower(): room for room in ROOMS}
+# Lower-cased device name -> ROOMS device name, per room and across all rooms (first room wins)
+_DEVICES_LOWER_BY_ROOM = {room: {device.lower(): device for device in devices} for room, devices in ROOMS.items()}
+# (built in reverse room order so earlier rooms overwrite later ones)
+_ALL_DEVICES_LOWER = {
+    device_lower: device
+    for room_devices in reversed(list(_DEVICES_LOWER_BY_ROOM.values()))
+    for device_lower, device in room_devices.items()
+}
+# Room name at the start of a device string ("Kitchen Light"), longest name first
+_RE_ROOM_PREFIX = re.compile(
+    "(" + "|".join(re.escape(room) for room in sorted(_ROOM_CANONICAL, key=len, reverse=True)) + ")(.*)",
+    re.IGNORECASE | re.DOTALL
+)
+# "in [room]" / "in the [room]" for every configured room, found in one scan
+_RE_IN_ROOM = re.compile(r"in (?:the )?(" + "|".join(re.escape(room) for room in _ROOM_CANONICAL) + r")")
+
+
+def _keyword_pattern(keywords: tuple) -> re.Pattern:
+    """
+    Compile a plain-substring alternation (same semantics as any(k in text for k in keywords)).
+    
+    Args:
+        keywords: Lower-case keywords/phrases to look for
+        
+    Returns:
+        Compiled pattern matching any of the keywords anywhere in a string
+    """
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+
+# Schedule activity classification (see MCPServer._is_one_time_activity)
+_RE_RECURRING_ACTIVITY = _keyword_pattern((
+    "wake up", "wake", "breakfast", "lunch", "dinner",
+    "work", "continue working", "exercise", "morning exercise",
+    "relaxation", "relaxation time", "prepare for bed", "sleep", "bedtime"
+))
+_RE_ONE_TIME_ACTIVITY = _keyword_pattern((
+    "meeting", "appointment", "doctor", "dentist", "gym",
+    "visit", "event", "party", "wedding", "birthday",
+    "conference", "seminar", "workshop", "class", "therapy",
+    "checkup", "consultation", "session"
+))
+_RE_ONE_TIME_PHRASE = _keyword_pattern((
+    "i have a", "i have an", "i need to", "i'm going to",
+    "i'm attending", "i'm visiting", "i'm going to the",
+    "this afternoon", "this evening", "this morning"
+))
+_RE_RECURRING_PHRASE = _keyword_pattern((
+    "every day", "daily", "always", "usually", "regularly",
+    "every morning", "every evening", "every week"
+))
+
+# rag_query condition-aware query enhancement
+_RE_EXERCISE_QUERY = _keyword_pattern(("exercise", "activity", "workout", "physical", "fitness", "movement"))
+_HEALTH_CONDITIONS = ("diabetes", "hypertension", "arthritis", "copd", "dementia", "depression", "stroke", "parkinson")
+_RE_HEALTH_CONDITION = _keyword_pattern(_HEALTH_CONDITIONS)
+
+
+@lru_cache(maxsize=64)
+def _extract_condition_terms(condition_lower: str) -> tuple:
+    """
+    Extract RAG key terms from a (lower-cased) user condition description.
+    
+    Args:
+        condition_lower: User condition text, lower-cased
+        
+    Returns:
+        Tuple of key terms: mobility terms first, then at most one health condition
+    """
+    key_terms = []
+    
+    # Extract mobility-related terms
+    if "wheelchair" in condition_lower:
+        key_terms.append("wheelchair")
+    if "mobility" in condition_lower:
+        key_terms.append("mobility")
+    
+    # Extract health condition terms - one scan, then the first in _HEALTH_CONDITIONS
+    # order is kept (usually only one primary condition)
+    mentioned = {match.group(0) for match in _RE_HEALTH_CONDITION.finditer(condition_lower)}
+    if mentioned:
+        key_terms.append(next(condition for condition in _HEALTH_CONDITIONS if condition in mentioned))
+    
+    return tuple(key_terms)
+
+
+def _schedule_time_key(item: dict) -> int:
+    """Sort key for schedule items (minutes since midnight, same order as StateManager.set_daily_clone)."""
+    return time_to_minutes(item.get("time", ""))
+
+
+@lru_cache(maxsize=256)
 def _normalize_time_format(time_str: str) -> str:
     """
     Normalize time string to HH:MM format.
@@ -57,17 +210,20 @@ def _extract_location_from_message(message: str) -> str:
         return None
     
     message_lower = message.lower()
-    from config import ROOMS
     
-    # Look for "in [room]" pattern
-    for room in ROOMS.keys():
-        room_lower = room.lower()
-        # Check for "in bedroom", "in living room", etc.
-        if f"in {room_lower}" in message_lower or f"in the {room_lower}" in message_lower:
+    # Look for "in [room]" pattern ("in bedroom", "in the living room", etc.).
+    # When several rooms are mentioned, the first in ROOMS order wins, as before.
+    mentioned = {match.group(1) for match in _RE_IN_ROOM.finditer(message_lower)}
+    if not mentioned:
+        return None
+    
+    for room_lower, room in _ROOM_CANONICAL.items():
+        if room_lower in mentioned:
             return room
     
     return None
 
+@lru_cache(maxsize=256)
 def _normalize_room_name(room_str: str) -> str:
     """
     Normalize room name to match ROOMS config.
@@ -85,27 +241,15 @@ def _normalize_room_name(room_str: str) -> str:
     room_lower = room_str.lower().strip()
     
     # Map variations to exact room names from ROOMS config
-    room_mapping = {
-        "bedroom": "Bedroom",
-        "bathroom": "Bathroom",
-        "kitchen": "Kitchen",
-        "livingroom": "Living Room",
-        "living room": "Living Room",
-        "living": "Living Room"
-    }
-    
-    normalized = room_mapping.get(room_lower)
+    normalized = _ROOM_MAPPING.get(room_lower)
     if normalized:
         return normalized
     
     # If not in mapping, check if it matches any room name exactly (case-insensitive)
-    for room_name in ROOMS.keys():
-        if room_name.lower() == room_lower:
-            return room_name
-    
-    return room_str  # Return original if no mapping found
+    return _ROOM_CANONICAL.get(room_lower, room_str)  # Original if no mapping found
 
 
+@lru_cache(maxsize=256)
 def _normalize_device_name(device_str: str, room: str = None) -> str:
     """
     Normalize device name to match ROOMS config.
@@ -124,24 +268,7 @@ def _normalize_device_name(device_str: str, room: str = None) -> str:
     device_lower = device_str.lower().strip()
     
     # Map common variations to exact device names
-    device_mapping = {
-        "light": "Light",
-        "lights": "Light",
-        "lamp": "Light",
-        "lamps": "Light",
-        "ac": "AC",
-        "air conditioner": "AC",
-        "airconditioner": "AC",
-        "air conditioning": "AC",
-        "tv": "TV",
-        "television": "TV",
-        "fan": "Fan",
-        "fans": "Fan",
-        "alarm": "Alarm",
-        "alarms": "Alarm"
-    }
-    
-    normalized = device_mapping.get(device_lower)
+    normalized = _DEVICE_MAPPING.get(device_lower)
     if normalized:
         # If room is provided, validate device exists in that room
         if room:
@@ -150,20 +277,14 @@ def _normalize_device_name(device_str: str, room: str = None) -> str:
                 return normalized
             else:
                 # Device doesn't exist in this room, try to find it in any room
-                print(f"[MCP WARNING] Device '{normalized}' not found in room '{room}'. Available devices: {room_devices}")
+                logger.warning("Device '%s' not found in room '%s'. Available devices: %s", normalized, room, room_devices)
         else:
             return normalized
     
     # If not in mapping, check if it matches any device name exactly (case-insensitive)
     # Check all rooms if room not specified, or just the specified room
-    rooms_to_check = [room] if room and room in ROOMS else ROOMS.keys()
-    
-    for room_name in rooms_to_check:
-        for device_name in ROOMS.get(room_name, []):
-            if device_name.lower() == device_lower:
-                return device_name
-    
-    return device_str  # Return original if no mapping found
+    devices_lower = _DEVICES_LOWER_BY_ROOM[room] if room and room in ROOMS else _ALL_DEVICES_LOWER
+    return devices_lower.get(device_lower, device_str)  # Original if no mapping found
 
 
 def _extract_date_from_message(message: str) -> str:
@@ -184,9 +305,12 @@ def _extract_date_from_message(message: str) -> str:
     if not message:
         return None
     
-    from datetime import datetime, timedelta
-    
     message_lower = message.lower().strip()
+    
+    # Every date form below needs a digit, "tomorrow" or "next" - reject the rest in one scan
+    if not _RE_DATE_HINT.search(message_lower):
+        return None
+    
     today = datetime.now()
     
     # Relative dates
@@ -199,13 +323,10 @@ def _extract_date_from_message(message: str) -> str:
         return next_week.strftime("%Y-%m-%d")
     
     # Day of week patterns: "next Monday", "next monday", "next tuesday", etc.
-    days_of_week = {
-        "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
-        "friday": 4, "saturday": 5, "sunday": 6
-    }
-    
-    for day_name, day_num in days_of_week.items():
-        if f"next {day_name}" in message_lower:
+    # One scan collects every "next <day>"; the earliest weekday (Monday first) wins, as before.
+    next_days = {match.group(1) for match in _RE_NEXT_WEEKDAY.finditer(message_lower)}
+    for day_name, day_num in _WEEKDAY_NUMBERS.items():
+        if day_name in next_days:
             days_ahead = (day_num - today.weekday()) % 7
             if days_ahead == 0:  # If today is that day, go to next week
                 days_ahead = 7
@@ -213,22 +334,18 @@ def _extract_date_from_message(message: str) -> str:
             return target_date.strftime("%Y-%m-%d")
     
     # Absolute date patterns: "March 15th", "15th March", "March 15", "15 March"
-    # Try to parse common date formats
-    import re
-    
-    # Pattern: "March 15th", "March 15", "15th March", "15 March"
-    month_names = {
-        "january": 1, "february": 2, "march": 3, "april": 4,
-        "may": 5, "june": 6, "july": 7, "august": 8,
-        "september": 9, "october": 10, "november": 11, "december": 12
-    }
+    # Each shape is one scan of a precompiled alternation. The first match per month is
+    # then tried in calendar order, so precedence matches the old per-month search.
     
     # Pattern 1: "Month Day" or "Month Dayth"
-    for month_name, month_num in month_names.items():
-        pattern = rf"{month_name}\s+(\d{{1,2}})(?:st|nd|rd|th)?"
-        match = re.search(pattern, message_lower)
-        if match:
-            day = int(match.group(1))
+    month_day_matches = {}
+    for match in _RE_MONTH_DAY.finditer(message_lower):
+        month_day_matches.setdefault(match.group(1), match.group(2))
+    
+    for month_name, month_num in _MONTH_NUMBERS.items():
+        day_str = month_day_matches.get(month_name)
+        if day_str is not None:
+            day = int(day_str)
             try:
                 # Use current year, or next year if date has passed
                 target_date = datetime(today.year, month_num, day)
@@ -239,11 +356,14 @@ def _extract_date_from_message(message: str) -> str:
                 pass  # Invalid date, continue
     
     # Pattern 2: "Day Month" or "Dayth Month"
-    for month_name, month_num in month_names.items():
-        pattern = rf"(\d{{1,2}})(?:st|nd|rd|th)?\s+{month_name}"
-        match = re.search(pattern, message_lower)
-        if match:
-            day = int(match.group(1))
+    day_month_matches = {}
+    for match in _RE_DAY_MONTH.finditer(message_lower):
+        day_month_matches.setdefault(match.group(2), match.group(1))
+    
+    for month_name, month_num in _MONTH_NUMBERS.items():
+        day_str = day_month_matches.get(month_name)
+        if day_str is not None:
+            day = int(day_str)
             try:
                 target_date = datetime(today.year, month_num, day)
                 if target_date < today:
@@ -253,12 +373,12 @@ def _extract_date_from_message(message: str) -> str:
                 pass  # Invalid date, continue
     
     # Pattern 3: YYYY-MM-DD format
-    date_pattern = r"\d{4}-\d{2}-\d{2}"
-    match = re.search(date_pattern, message)
+    match = _RE_ISO_DATE.search(message)
     if match:
         date_str = match.group(0)
         try:
-            parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
+            # fromisoformat validates the calendar date without strptime's regex/locale machinery
+            parsed_date = datetime.fromisoformat(date_str)
             return parsed_date.strftime("%Y-%m-%d")
         except ValueError:
             pass
@@ -267,6 +387,20 @@ def _extract_date_from_message(message: str) -> str:
     return None
 
 
+def _in_state_batch(method):
+    """
+    Decorator for MCPServer tools that do several state reads/writes: runs the call inside
+    state_manager.batch() so all of them share one database session and commit once.
+    A tool that catches its own errors must call state_manager.rollback_batch() before
+    returning the error, or its partial writes are committed.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.state_manager.batch():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class MCPServer:
     """
     MCP Server that provides tools for the LLM to interact with the system.
@@ -394,18 +528,15 @@ class MCPServer:
         # Check if device string contains a room name
         device_room = None
         device_only = device
-        for room_name in ROOMS.keys():
-            room_lower = room_name.lower()
-            device_lower = device.lower()
-            # Check if device string starts with room name (e.g., "Kitchen Light")
-            if device_lower.startswith(room_lower):
-                # Extract device part after room name
-                remaining = device[len(room_name):].strip()
-                if remaining:
-                    device_room = room_name
-                    device_only = remaining
-                    print(f"[MCP DEBUG] Extracted room from device name: '{device}' -> room='{device_room}', device='{device_only}'")
-                    break
+        # Check if device string starts with room name (e.g., "Kitchen Light") - one anchored match
+        prefix_match = _RE_ROOM_PREFIX.match(device)
+        if prefix_match:
+            # Extract device part after room name
+            remaining = prefix_match.group(2).strip()
+            if remaining:
+                device_room = _ROOM_CANONICAL[prefix_match.group(1).lower()]
+                device_only = remaining
+                logger.debug("Extracted room from device name: '%s' -> room='%s', device='%s'", device, device_room, device_only)
         
         # Use extracted room if found, otherwise use provided room
         room_to_use = device_room if device_room else room
@@ -416,28 +547,28 @@ class MCPServer:
         
         # Normalize device name to match config
         device_normalized = _normalize_device_name(device_to_use, room_normalized)
-        print(f"[MCP DEBUG] e_device_control: room='{room}' -> normalized='{room_normalized}', device='{device}' -> normalized='{device_normalized}', action='{action_upper}'")
+        logger.debug("e_device_control: room='%s' -> normalized='%s', device='%s' -> normalized='%s', action='%s'", room, room_normalized, device, device_normalized, action_upper)
         
         # Get current state before change
         previous_state = self.state_manager.get_device_state(room_normalized, device_normalized)
-        print(f"[MCP DEBUG] Previous state: {previous_state}")
+        logger.debug("Previous state: %s", previous_state)
         
         # Convert action to boolean
         new_state = action_upper == "ON"
-        print(f"[MCP DEBUG] New state: {new_state}")
+        logger.debug("New state: %s", new_state)
         
         # Update device state
         success = self.state_manager.set_device_state(room_normalized, device_normalized, new_state)
-        print(f"[MCP DEBUG] set_device_state result: success={success}")
+        logger.debug("set_device_state result: success=%s", success)
         
         if success:
             # Verify the state was actually updated
             verify_state = self.state_manager.get_device_state(room_normalized, device_normalized)
-            print(f"[MCP DEBUG] Verified state after update: {verify_state} (expected: {new_state})")
+            logger.debug("Verified state after update: %s (expected: %s)", verify_state, new_state)
             if verify_state != new_state:
-                print(f"[MCP ERROR] State mismatch! Expected {new_state}, got {verify_state}")
+                logger.error("State mismatch! Expected %s, got %s", new_state, verify_state)
             else:
-                print(f"[MCP SUCCESS] State verified correctly: {room_normalized} {device_normalized} = {verify_state}")
+                logger.debug("State verified correctly: %s %s = %s", room_normalized, device_normalized, verify_state)
         
         if success:
             state_text = "ON" if new_state else "OFF"
@@ -452,7 +583,7 @@ class MCPServer:
                 "message": f"Set {room_normalized} {device_normalized} to {state_text}",
                 "error": None
             }
-            print(f"[MCP DEBUG] Returning success result: {result}")
+            logger.debug("Returning success result: %s", result)
             return result
         else:
             result = {
@@ -466,7 +597,7 @@ class MCPServer:
                 "message": "",
                 "error": f"Device '{device_normalized}' not found in room '{room_normalized}'. Available devices: {ROOMS.get(room_normalized, [])}"
             }
-            print(f"[MCP DEBUG] Returning failure result: {result}")
+            logger.debug("Returning failure result: %s", result)
             return result
     
     def get_current_state(self, custom_date: str = None, current_activity: dict = None) -> dict:
@@ -487,9 +618,15 @@ class MCPServer:
                 "current_activity": dict or None
             }
         """
-        # Phase 5: Cleanup old one-time events periodically (every state fetch)
-        # This prevents accumulation of old events
-        self.state_manager.cleanup_old_one_time_events()
+        # Phase 5: Cleanup old one-time events periodically
+        # This prevents accumulation of old events. Events only go stale when the date
+        # changes or state is written, so skip the cleanup query while neither has happened
+        # since the last run. (getattr covers servers created before this existed)
+        cleanup_key = (id(self.state_manager), datetime.now().strftime("%Y-%m-%d"), self.state_manager.revision)
+        if getattr(self, '_cleanup_key', None) != cleanup_key:
+            self.state_manager.cleanup_old_one_time_events()
+            # Re-read the revision: it is bumped when the cleanup removed something
+            self._cleanup_key = cleanup_key[:2] + (self.state_manager.revision,)
         
         state_summary = self.state_manager.get_state_summary(custom_date=custom_date)
         state_summary["current_activity"] = current_activity  # Add current activity to state
@@ -514,6 +651,17 @@ class MCPServer:
                 ...
             ]
         """
+        # Reuse the last scan while the state revision is unchanged: device states, location
+        # and notification preferences only change through StateManager methods that bump it.
+        # Other sessions can write the shared database without bumping it, so a scan is also
+        # only reused for STATE_CACHE_TTL seconds.
+        # (getattr covers servers created before this cache existed, e.g. in a live session)
+        revision = (id(self.state_manager), self.state_manager.revision)
+        now = monotonic()
+        if (getattr(self, '_issues_revision', None) == revision
+                and now < getattr(self, '_issues_expires', 0.0)):
+            return [dict(issue) for issue in self._issues_cache]
+        
         current_location = self.state_manager.current_location
         all_devices = self.state_manager.get_all_devices()
         issues = []
@@ -534,7 +682,11 @@ class MCPServer:
                         "user_location": current_location
                     })
         
-        return issues
+        self._issues_cache = issues
+        self._issues_revision = revision
+        self._issues_expires = now + STATE_CACHE_TTL
+        # Callers get their own copies so the cached scan can't be mutated through them
+        return [dict(issue) for issue in issues]
     
     def _is_one_time_activity(self, activity: str, user_message: str = None) -> bool:
         """
@@ -551,60 +703,23 @@ class MCPServer:
             return True  # Default to one-time if no activity
         
         activity_lower = activity.lower()
-        message_lower = (user_message or "").lower()
-        
-        # Known recurring activities (daily routines)
-        recurring_keywords = [
-            "wake up", "wake", "breakfast", "lunch", "dinner",
-            "work", "continue working", "exercise", "morning exercise",
-            "relaxation", "relaxation time", "prepare for bed", "sleep", "bedtime"
-        ]
-        
-        # Check if activity matches recurring patterns
-        for keyword in recurring_keywords:
-            if keyword in activity_lower:
-                # Check if user message overrides with "every day" or similar
-                if user_message:
-                    recurring_phrases = ["every day", "daily", "always", "regularly", "every morning", "every evening"]
-                    if any(phrase in message_lower for phrase in recurring_phrases):
-                        return False  # Explicitly recurring
-                return False  # It's recurring
         
-        # One-time event keywords
-        one_time_keywords = [
-            "meeting", "appointment", "doctor", "dentist", "gym",
-            "visit", "event", "party", "wedding", "birthday",
-            "conference", "seminar", "workshop", "class", "therapy",
-            "checkup", "consultation", "session"
-        ]
+        # Check if activity matches recurring patterns (daily routines).
+        # A recurring activity stays recurring whatever the message says.
+        if _RE_RECURRING_ACTIVITY.search(activity_lower):
+            return False  # It's recurring
         
         # Check if activity matches one-time patterns
-        for keyword in one_time_keywords:
-            if keyword in activity_lower:
-                return True  # It's one-time
+        if _RE_ONE_TIME_ACTIVITY.search(activity_lower):
+            return True  # It's one-time
         
-        # Check user message for context clues
+        # Check user message for context clues (one-time phrases take precedence)
         if user_message:
-            # Phrases that indicate one-time events
-            one_time_phrases = [
-                "i have a", "i have an", "i need to", "i'm going to",
-                "i'm attending", "i'm visiting", "i'm going to the",
-                "this afternoon", "this evening", "this morning"
-            ]
-            
-            # Phrases that indicate recurring
-            recurring_phrases = [
-                "every day", "daily", "always", "usually", "regularly",
-                "every morning", "every evening", "every week"
-            ]
-            
-            for phrase in one_time_phrases:
-                if phrase in message_lower:
-                    return True
-            
-            for phrase in recurring_phrases:
-                if phrase in message_lower:
-                    return False
+            message_lower = user_message.lower()
+            if _RE_ONE_TIME_PHRASE.search(message_lower):
+                return True
+            if _RE_RECURRING_PHRASE.search(message_lower):
+                return False
         
         # Default: If activity is not in known recurring list, assume one-time
         # This is safer - user can always add it as recurring explicitly later
@@ -649,11 +764,11 @@ class MCPServer:
         if preserve_from_base:
             base_item = self._get_base_schedule_item(item.get("time"), activity)
             if base_item:
-                # Preserve action and location from base schedule
+                # Preserve action and location from base schedule. base_item comes from a fresh
+                # database read (action is json-decoded per fetch), so it is not shared and
+                # can be taken over without copying
                 if "action" in base_item:
-                    item["action"] = base_item["action"].copy()
-                    if "devices" in item["action"]:
-                        item["action"]["devices"] = [d.copy() for d in item["action"]["devices"]]
+                    item["action"] = base_item["action"]
                 if "location" in base_item:
                     item["location"] = base_item["location"]
                 return item
@@ -678,6 +793,7 @@ class MCPServer:
         
         return item
     
+    @_in_state_batch
     def schedule_modifier(self, modify_type: str, time: str = None, 
                          activity: str = None, old_time: str = None, 
                          old_activity: str = None, user_message: str = None,
@@ -723,12 +839,12 @@ class MCPServer:
                 "error": str (only if success=False)
             }
         """
-        from datetime import datetime
-        
         # Determine what "today" is - use real datetime
         # Note: If custom clock date support is needed, it should be passed as a parameter
-        today = datetime.now().strftime("%Y-%m-%d")
-        print(f"[SCHEDULE MODIFIER] Using date as 'today': {today}")
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        today_date = now.date()
+        logger.debug("Using date as 'today': %s", today)
         
         # Normalize time format if provided
         if time:
@@ -797,8 +913,8 @@ class MCPServer:
                 
                 # Validate date is not in the past
                 try:
-                    target_datetime = datetime.strptime(target_date, "%Y-%m-%d")
-                    if target_datetime.date() < datetime.now().date():
+                    # target_date is always YYYY-MM-DD here; fromisoformat avoids strptime's overhead
+                    if date.fromisoformat(target_date) < today_date:
                         return {
                             "success": False,
                             "tool": "schedule_modifier",
@@ -829,12 +945,12 @@ class MCPServer:
                     # If date is today, also add to today's daily clone
                     if target_date == today:
                         daily_clone = self.state_manager.get_daily_clone()
-                        daily_clone.append(new_item)
-                        daily_clone.sort(key=lambda x: x.get("time", ""))
+                        # Clone is kept sorted by time - binary-search insert instead of a full re-sort
+                        insort(daily_clone, new_item, key=_schedule_time_key)
                         self.state_manager.set_daily_clone(daily_clone)
-                        print(f"[SCHEDULE MODIFIER] Added one-time event to today's daily clone: {activity} at {time}")
+                        logger.debug("Added one-time event to today's daily clone: %s at %s", activity, time)
                     else:
-                        print(f"[SCHEDULE MODIFIER] Added one-time event for future date {target_date}: {activity} at {time}")
+                        logger.debug("Added one-time event for future date %s: %s at %s", target_date, activity, time)
                     
                     # Do NOT add to base schedule (one-time events don't recur)
                     message = f"Added one-time event '{activity}' at {time}"
@@ -845,27 +961,24 @@ class MCPServer:
                     if target_date == today:
                         # Add to today's daily clone
                         daily_clone = self.state_manager.get_daily_clone()
-                        daily_clone.append(new_item)
-                        daily_clone.sort(key=lambda x: x.get("time", ""))
+                        # Clone is kept sorted by time - binary-search insert instead of a full re-sort
+                        insort(daily_clone, new_item, key=_schedule_time_key)
                         self.state_manager.set_daily_clone(daily_clone)
-                        print(f"[SCHEDULE MODIFIER] Added to today's daily clone: {activity} at {time}")
+                        logger.debug("Added to today's daily clone: %s at %s", activity, time)
                     
-                    # Add to base schedule (for all future days)
-                    base_schedule = self.state_manager.get_user_schedule()
-                    exists_in_base = any(item.get("time") == time for item in base_schedule)
-                    if not exists_in_base:
-                        self.state_manager.update_base_schedule([new_item.copy()])
-                        print(f"[SCHEDULE MODIFIER] Added to base schedule for recurring: {activity} at {time}")
+                    # Add to base schedule (for all future days) - one upsert, no schedule fetch
+                    if self.state_manager.upsert_base_item(new_item.copy()):
+                        logger.debug("Added to base schedule for recurring: %s at %s", activity, time)
                     else:
-                        self.state_manager.update_base_schedule([new_item.copy()])
-                        print(f"[SCHEDULE MODIFIER] Updated base schedule item at {time}: {activity}")
+                        logger.debug("Updated base schedule item at %s: %s", time, activity)
                     
                     message = f"Added recurring activity '{activity}' at {time}"
                     if target_date != today:
                         message += f" (will appear in schedule starting from {target_date})"
                 
-                # Debug: Verify the add was applied with all fields (only for today's clone)
-                if target_date == today:
+                # Debug: Verify the add was applied with all fields (only for today's clone,
+                # and only when VERIFY_SCHEDULE_WRITES is enabled - it costs an extra read + scan)
+                if VERIFY_SCHEDULE_WRITES and target_date == today:
                     verify_clone = self.state_manager.get_daily_clone()
                     verify_item = next((item for item in verify_clone if item.get("time") == time and item.get("activity") == activity), None)
                     if verify_item:
@@ -879,10 +992,10 @@ class MCPServer:
                         if "location" in verify_item:
                             fields_present.append("location")
                         
-                        print(f"[SCHEDULE MODIFIER] [OK] VERIFIED: Schedule item added successfully - {activity} at {time}")
-                        print(f"[SCHEDULE MODIFIER] Fields present: {fields_present}")
+                        logger.debug("VERIFIED: Schedule item added successfully - %s at %s", activity, time)
+                        logger.debug("Fields present: %s", fields_present)
                     else:
-                        print(f"[SCHEDULE MODIFIER] [WARNING] Schedule add may not have been applied correctly - {activity} not found at {time}")
+                        logger.warning("Schedule add may not have been applied correctly - %s not found at %s", activity, time)
                 
                 return {
                     "success": True,
@@ -912,19 +1025,20 @@ class MCPServer:
                         removed_activity = item.get("activity", "")
                         daily_clone.pop(idx)
                         found = True
-                        print(f"[SCHEDULE MODIFIER] Removed item at {time} ('{removed_activity}') from today's schedule")
+                        logger.debug("Removed item at %s ('%s') from today's schedule", time, removed_activity)
                         break
                 
                 if found:
                     self.state_manager.set_daily_clone(daily_clone)
                     
-                    # Debug: Verify the delete was applied
-                    verify_clone = self.state_manager.get_daily_clone()
-                    verify_item = next((item for item in verify_clone if item.get("time") == time), None)
-                    if not verify_item:
-                        print(f"[SCHEDULE MODIFIER] [OK] VERIFIED: Schedule item deleted successfully - no item at {time}")
-                    else:
-                        print(f"[SCHEDULE MODIFIER] [WARNING] Schedule delete may not have been applied correctly - item still exists at {time}")
+                    # Debug: Verify the delete was applied (only when VERIFY_SCHEDULE_WRITES is enabled)
+                    if VERIFY_SCHEDULE_WRITES:
+                        verify_clone = self.state_manager.get_daily_clone()
+                        verify_item = next((item for item in verify_clone if item.get("time") == time), None)
+                        if not verify_item:
+                            logger.debug("VERIFIED: Schedule item deleted successfully - no item at %s", time)
+                        else:
+                            logger.warning("Schedule delete may not have been applied correctly - item still exists at %s", time)
                     
                     return {
                         "success": True,
@@ -994,11 +1108,10 @@ class MCPServer:
                         # Check if item exists in base schedule - if so, preserve from base
                         base_item = self._get_base_schedule_item(new_item["time"], new_activity)
                         if base_item:
-                            # Preserve from base schedule
+                            # Preserve from base schedule (fresh database read - no copy needed,
+                            # see _apply_derivation)
                             if "action" in base_item:
-                                new_item["action"] = base_item["action"].copy()
-                                if "devices" in new_item["action"]:
-                                    new_item["action"]["devices"] = [d.copy() for d in new_item["action"]["devices"]]
+                                new_item["action"] = base_item["action"]
                             if "location" in base_item:
                                 new_item["location"] = base_item["location"]
                         else:
@@ -1022,8 +1135,8 @@ class MCPServer:
                         # Remove old item and add new item
                         old_activity_name = item.get("activity", "")
                         daily_clone.pop(idx)
-                        daily_clone.append(new_item)
-                        daily_clone.sort(key=lambda x: x.get("time", ""))
+                        # Clone is kept sorted by time - binary-search insert instead of a full re-sort
+                        insort(daily_clone, new_item, key=_schedule_time_key)
                         found = True
                         # Build change message based on what was updated
                         change_parts = []
@@ -1032,29 +1145,32 @@ class MCPServer:
                         if activity and activity != old_activity_name:
                             change_parts.append(f"activity from '{old_activity_name}' to '{activity}'")
                         change_msg = " and ".join(change_parts) if change_parts else "item"
-                        print(f"[SCHEDULE MODIFIER] Changed {change_msg} in today's schedule")
+                        logger.debug("Changed %s in today's schedule", change_msg)
                         break
                 
                 if found:
                     self.state_manager.set_daily_clone(daily_clone)
                     
-                    # Debug: Verify the change was applied
-                    verify_clone = self.state_manager.get_daily_clone()
                     new_time = new_item.get("time")
                     new_activity = new_item.get("activity")
-                    verify_item = next((item for item in verify_clone if item.get("time") == new_time and item.get("activity") == new_activity), None)
-                    old_item_still_exists = next((item for item in verify_clone if item.get("time") == old_time and item.get("activity") == old_activity_name), None)
                     
-                    if verify_item and not old_item_still_exists:
-                        print(f"[SCHEDULE MODIFIER] [OK] VERIFIED: Schedule change applied successfully - {new_activity} is now at {new_time} (old time {old_time} removed)")
-                    elif verify_item:
-                        print(f"[SCHEDULE MODIFIER] [OK] VERIFIED: Schedule change applied - {new_activity} is now at {new_time} (but old item may still exist)")
-                    else:
-                        print(f"[SCHEDULE MODIFIER] [WARNING] Schedule change may not have been applied correctly - {new_activity} not found at {new_time}")
-                    
-                    # Log current schedule state for debugging
-                    schedule_items = [f"{item.get('time')}: {item.get('activity')}" for item in verify_clone]
-                    print(f"[SCHEDULE MODIFIER] Current schedule state: {schedule_items}")
+                    # Debug: Verify the change was applied (only when VERIFY_SCHEDULE_WRITES is enabled)
+                    if VERIFY_SCHEDULE_WRITES:
+                        verify_clone = self.state_manager.get_daily_clone()
+                        verify_item = next((item for item in verify_clone if item.get("time") == new_time and item.get("activity") == new_activity), None)
+                        old_item_still_exists = next((item for item in verify_clone if item.get("time") == old_time and item.get("activity") == old_activity_name), None)
+                        
+                        if verify_item and not old_item_still_exists:
+                            logger.debug("VERIFIED: Schedule change applied successfully - %s is now at %s (old time %s removed)", new_activity, new_time, old_time)
+                        elif verify_item:
+                            logger.debug("VERIFIED: Schedule change applied - %s is now at %s (but old item may still exist)", new_activity, new_time)
+                        else:
+                            logger.warning("Schedule change may not have been applied correctly - %s not found at %s", new_activity, new_time)
+                        
+                        # Log current schedule state for debugging (only built when DEBUG is enabled)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            schedule_items = [f"{item.get('time')}: {item.get('activity')}" for item in verify_clone]
+                            logger.debug("Current schedule state: %s", schedule_items)
                     
                     # Build message based on what was changed
                     change_parts = []
@@ -1091,6 +1207,9 @@ class MCPServer:
                 }
         
         except Exception as e:
+            # The error is returned rather than raised, so undo this call's partial writes here
+            # (otherwise @_in_state_batch would commit them)
+            self.state_manager.rollback_batch()
             return {
                 "success": False,
                 "tool": "schedule_modifier",
@@ -1102,6 +1221,21 @@ class MCPServer:
         """
         Get or initialize RAG retriever instance (lazy loading).
         
+        Returns:
+            Retriever instance, or None if initialization fails
+        """
+        if self._rag_retriever is not None:
+            return self._rag_retriever
+        
+        # If a warm-up thread is already loading the retriever, this waits for it instead of
+        # building a second one; afterwards the re-check picks up its result
+        with _RAG_INIT_LOCK:
+            return self._init_rag_retriever_locked()
+    
+    def _init_rag_retriever_locked(self):
+        """
+        Construct the RAG retriever if it doesn't exist yet (caller holds _RAG_INIT_LOCK).
+        
         Returns:
             Retriever instance, or None if initialization fails
         """
@@ -1131,6 +1265,20 @@ class MCPServer:
                 return None
         return self._rag_retriever
     
+    def warm_up_rag_retriever(self) -> threading.Thread:
+        """
+        Start loading the RAG retriever (embedding model + index) in a background thread.
+        
+        The first rag_query then doesn't pay the multi-second model load on the request path;
+        if it arrives while loading is still in progress, it waits for the same load.
+        
+        Returns:
+            The started daemon thread
+        """
+        thread = threading.Thread(target=self._get_rag_retriever, name="rag-warmup", daemon=True)
+        thread.start()
+        return thread
+    
     def rag_query(self, query: str, user_condition: str = None) -> dict:
         """
         Tool: Query RAG system for health knowledge.
@@ -1177,30 +1325,17 @@ class MCPServer:
             condition_lower = user_condition.lower()
             
             # For exercise/activity queries, add wheelchair-specific terms if condition mentions wheelchair
-            is_exercise_query = any(word in query_lower for word in ["exercise", "activity", "workout", "physical", "fitness", "movement"])
-            has_wheelchair = "wheelchair" in condition_lower or "uses a wheelchair" in condition_lower
+            is_exercise_query = _RE_EXERCISE_QUERY.search(query_lower) is not None
+            has_wheelchair = "wheelchair" in condition_lower
             
             if is_exercise_query and has_wheelchair:
                 # Prioritize wheelchair exercise knowledge
                 enhanced_query = f"{query.strip()} wheelchair exercises wheelchair users seated exercises"
-                print(f"[RAG] Enhanced exercise query for wheelchair user: {enhanced_query[:100]}...")
+                logger.debug("RAG: Enhanced exercise query for wheelchair user: %.100s...", enhanced_query)
             else:
                 # General enhancement with key terms extraction
-                # Extract key terms from user condition for better matching
-                key_terms = []
-                
-                # Extract mobility-related terms
-                if "wheelchair" in condition_lower:
-                    key_terms.append("wheelchair")
-                if "mobility" in condition_lower:
-                    key_terms.append("mobility")
-                
-                # Extract health condition terms
-                health_conditions = ["diabetes", "hypertension", "arthritis", "copd", "dementia", "depression", "stroke", "parkinson"]
-                for condition in health_conditions:
-                    if condition in condition_lower:
-                        key_terms.append(condition)
-                        break  # Usually only one primary condition
+                # Extract key terms from user condition for better matching (cached per condition)
+                key_terms = _extract_condition_terms(condition_lower)
                 
                 # Build enhanced query with key terms prioritized
                 if key_terms:
@@ -1208,9 +1343,9 @@ class MCPServer:
                 else:
                     enhanced_query = f"{query.strip()} {user_condition.strip()}"
                 
-                print(f"[RAG] Enhanced query with key terms: {enhanced_query[:100]}...")
+                logger.debug("RAG: Enhanced query with key terms: %.100s...", enhanced_query)
         else:
-            print(f"[RAG] Query (no condition): {enhanced_query[:100]}...")
+            logger.debug("RAG: Query (no condition): %.100s...", enhanced_query)
         
         try:
             # Call RAG retriever with higher threshold for better precision
@@ -1219,7 +1354,7 @@ class MCPServer:
             
             if result.get("found"):
                 chunks = result.get("chunks", [])
-                print(f"[RAG] Found {len(chunks)} relevant chunk(s)")
+                logger.debug("RAG: Found %d relevant chunk(s)", len(chunks))
                 return {
                     "success": True,
                     "tool": "rag_query",
@@ -1228,7 +1363,7 @@ class MCPServer:
                     "error": None
                 }
             else:
-                print(f"[RAG] No relevant results found (below threshold)")
+                logger.debug("RAG: No relevant results found (below threshold)")
                 return {
                     "success": True,
                     "tool": "rag_query",
@@ -1238,7 +1373,7 @@ class MCPServer:
                 }
         
         except Exception as e:
-            print(f"[RAG] ERROR during retrieval: {e}")
+            logger.error("RAG: Error during retrieval: %s", e)
             return {
                 "success": False,
                 "tool": "rag_query",
@@ -0,0 +1,111 @@
+"""
+Offline index builder for WheelSense RAG.
+
+Rebuilds faiss_index.bin from the chunk texts stored in id_to_chunk.json.
+Small knowledge bases keep an exact IndexFlatIP; once the corpus reaches
+IVF_MIN_VECTORS, an IVF index is trained instead so each query scans only
+nprobe inverted lists. Vectors in the lists are compressed with either
+product quantization (PQ_M bytes/vector, default) or 8-bit scalar
+quantization (one byte per dimension, closer to Flat accuracy).
+
+Usage:
+    python -m rag.retrieval.indexer [embeddings_dir] [--codec pq|sq8]
+"""
+
+import argparse
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+
+IVF_NLIST = 256
+PQ_M = 16
+# IVF training needs enough points for the coarse (and PQ) quantizers
+IVF_MIN_VECTORS = 10000
+TRAIN_SAMPLE_SIZE = 65536
+
+# Factory suffix for the vectors stored in the inverted lists
+CODECS = {
+    "pq": f"PQ{PQ_M}x8",
+    "sq8": "SQ8",
+}
+
+
+def build_index(vectors: np.ndarray, codec: str = "pq") -> faiss.Index:
+    """
+    Build an inner-product FAISS index for L2-normalized vectors.
+    
+    Args:
+        vectors: Array of shape (n, dimension), already normalized
+        codec: Inverted-list encoding for large corpora, "pq" or "sq8" (default: "pq")
+        
+    Returns:
+        IndexFlatIP for small corpora, trained IVF index otherwise
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if len(vectors) < IVF_MIN_VECTORS:
+        index = faiss.IndexFlatIP(vectors.shape[1])
+    else:
+        index = faiss.index_factory(
+            vectors.shape[1], f"IVF{IVF_NLIST},{CODECS[codec]}", faiss.METRIC_INNER_PRODUCT
+        )
+        rng = np.random.default_rng(0)
+        sample_size = min(len(vectors), TRAIN_SAMPLE_SIZE)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def rebuild(embeddings_dir: Path = None, codec: str = "pq") -> faiss.Index:
+    """
+    Re-embed every chunk in id_to_chunk.json and write a fresh faiss_index.bin.
+    
+    Args:
+        embeddings_dir: Optional path to embeddings directory. If None, uses default location.
+        codec: Inverted-list encoding used once the corpus is large enough for IVF
+        
+    Returns:
+        The index that was written
+    """
+    if embeddings_dir is None:
+        embeddings_dir = Path(__file__).parent.parent / "embeddings"
+    else:
+        embeddings_dir = Path(embeddings_dir)
+    
+    mapping_file = embeddings_dir / "id_to_chunk.json"
+    with open(mapping_file, 'r', encoding='utf-8') as f:
+        mapping_data = json.load(f)
+    texts = [chunk['text'] for chunk in mapping_data['id_to_chunk']]
+    
+    print("Loading embedding model: all-MiniLM-L6-v2")
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    vectors = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    
+    index = build_index(vectors, codec)
+    faiss.write_index(index, str(embeddings_dir / "faiss_index.bin"))
+    
+    # Keep mapping metadata in sync with the index that was actually written
+    mapping_data['metadata'] = {
+        **mapping_data.get('metadata', {}),
+        'total_vectors': index.ntotal,
+        'dimension': int(vectors.shape[1]),
+        'index_type': type(index).__name__,
+        'created_at': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+    }
+    with open(mapping_file, 'w', encoding='utf-8') as f:
+        json.dump(mapping_data, f, ensure_ascii=False, indent=2)
+    
+    print(f"✓ Wrote {type(index).__name__} with {index.ntotal} vectors")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the WheelSense RAG FAISS index")
+    parser.add_argument("embeddings_dir", nargs="?", default=None)
+    parser.add_argument("--codec", choices=sorted(CODECS), default="pq")
+    args = parser.parse_args()
+    rebuild(args.embeddings_dir, args.codec)
@@ -12,28 +12,58 @@ Features:
 """
 
 import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 import numpy as np
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 
+from config import RAG_ONNX_ENCODER, RAG_ONNX_MODEL_FILE
 
-def normalize_embedding(embedding: np.ndarray) -> np.ndarray:
+# Inverted lists probed per query when the loaded index is IVF-based
+IVF_NPROBE = 10
+
+# Recent query embeddings kept per Retriever (LRU)
+EMBED_CACHE_SIZE = 512
+
+# Retrievers shared by the module-level retrieve(), keyed by embeddings directory
+_RETRIEVERS: Dict[Optional[Path], "Retriever"] = {}
+_RETRIEVERS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_name: str) -> SentenceTransformer:
     """
-    Normalize embedding vector using L2 normalization.
+    Load an embedding model once per process and share it between Retriever instances.
     
     Args:
-        embedding: Input embedding vector
+        model_name: SentenceTransformer model name
         
     Returns:
-        Normalized embedding vector (unit vector)
+        Model on GPU in fp16 when CUDA is available; otherwise the int8 ONNX Runtime
+        model if RAG_ONNX_ENCODER is set, else the fp32 PyTorch model on CPU
     """
-    norm = np.linalg.norm(embedding)
-    if norm == 0:
-        return embedding
-    return embedding / norm
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device == "cpu" and RAG_ONNX_ENCODER:
+        try:
+            print(f"Loading embedding model: {model_name} (onnx, {RAG_ONNX_MODEL_FILE})")
+            return SentenceTransformer(
+                model_name, device=device, backend="onnx",
+                model_kwargs={"file_name": RAG_ONNX_MODEL_FILE}
+            )
+        except Exception as e:
+            # Older sentence-transformers or missing optimum/onnxruntime: use the PyTorch encoder
+            print(f"ONNX encoder unavailable ({type(e).__name__}: {e}), falling back to PyTorch")
+    print(f"Loading embedding model: {model_name} ({device})")
+    model = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        model.half()
+    return model
 
 
 class Retriever:
@@ -41,13 +71,21 @@ class Retriever:
     Retrieval class for performing similarity search over knowledge chunks.
     """
     
-    def __init__(self, embeddings_dir: Path = None):
+    def __init__(self, embeddings_dir: Path = None, n_threads: Optional[int] = None):
         """
         Initialize the Retriever by loading FAISS index, ID mapping, and embedding model.
         
         Args:
             embeddings_dir: Optional path to embeddings directory. If None, uses default location.
+            n_threads: Optional thread count for FAISS (OpenMP) and the PyTorch encoder.
+                      Both settings are process-wide. Use os.cpu_count() when queries arrive
+                      one at a time, or 1 when many requests run in parallel so each request
+                      does not grab every core. If None, library defaults are kept.
         """
+        if n_threads is not None:
+            faiss.omp_set_num_threads(n_threads)
+            torch.set_num_threads(n_threads)
+        
         # Determine paths
         if embeddings_dir is None:
             # Default: assume embeddings/ is sibling to retrieval/
@@ -64,7 +102,14 @@ class Retriever:
         if not index_file.exists():
             raise FileNotFoundError(f"FAISS index not found: {index_file}")
         print(f"Loading FAISS index from: {index_file}")
-        self.index = faiss.read_index(str(index_file))
+        # Memory-map so IVF lists are paged in on demand (keep the file on a local disk, not NFS)
+        self.index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        
+        # IVF indexes (large corpora, see rag/retrieval/indexer.py) only scan nprobe lists per query
+        try:
+            faiss.extract_index_ivf(self.index).nprobe = IVF_NPROBE
+        except RuntimeError:
+            pass  # Flat index: exhaustive search is exact and cheap at this size
         
         # Load ID mapping
         if not mapping_file.exists():
@@ -82,12 +127,141 @@ class Retriever:
                 f"mapping size ({len(self.id_to_chunk)})"
             )
         
-        # Load embedding model
-        print("Loading embedding model: all-MiniLM-L6-v2")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Load embedding model (shared across instances)
+        self.model = _load_model('all-MiniLM-L6-v2')
+        
+        # LRU of normalized query key -> (d,) float32 query vector
+        self._embed_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Guards the LRU: one Retriever serves concurrent rag_query calls (batch dispatch,
+        # module-level retrieve()). The model encode runs outside the lock.
+        self._embed_cache_lock = threading.Lock()
         
         print(f"✓ Retriever initialized with {self.index.ntotal} vectors")
     
+    def _embed_batch(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed queries into a normalized (len(queries), dimension) float32 matrix.
+        
+        Recently seen queries are served from the LRU cache; the rest are encoded
+        together in a single model forward pass.
+        
+        Args:
+            queries: Non-empty query strings
+            
+        Returns:
+            Query matrix ready for FAISS search
+        """
+        # The MiniLM tokenizer is uncased and ignores surrounding whitespace
+        keys = [query.strip().lower() for query in queries]
+        vectors = {}
+        misses = {}
+        with self._embed_cache_lock:
+            for key, query in zip(keys, queries):
+                vector = self._embed_cache.get(key)
+                if vector is not None:
+                    self._embed_cache.move_to_end(key)
+                    vectors[key] = vector
+                elif key not in misses:
+                    misses[key] = query
+        
+        if misses:
+            # Embed all uncached queries in one batched forward pass (fp16 on GPU is upcast for FAISS)
+            embeddings = np.ascontiguousarray(
+                self.model.encode(list(misses.values()), convert_to_numpy=True, batch_size=32),
+                dtype=np.float32
+            )
+            
+            # Normalize embeddings in place (matches how chunks were embedded)
+            faiss.normalize_L2(embeddings)
+            
+            for key, vector in zip(misses, embeddings):
+                vector.flags.writeable = False
+                vectors[key] = vector
+            with self._embed_cache_lock:
+                for key in misses:
+                    self._embed_cache[key] = vectors[key]
+                    self._embed_cache.move_to_end(key)
+                while len(self._embed_cache) > EMBED_CACHE_SIZE:
+                    self._embed_cache.popitem(last=False)
+        
+        if len(keys) == 1:
+            # Single query: a (1, d) view of the cached row, no copy
+            return vectors[keys[0]][np.newaxis]
+        return np.stack([vectors[key] for key in keys])
+    
+    def _build_result(self, scores: np.ndarray, indices: np.ndarray, threshold: float, score_gap_threshold: float) -> Dict[str, Any]:
+        """
+        Turn one row of FAISS search output into a retrieval result.
+        
+        Args:
+            scores: Similarity scores for one query, shape (k,)
+            indices: FAISS vector IDs for one query, shape (k,)
+            threshold: Minimum similarity score threshold
+            score_gap_threshold: Gap above which only the top result is kept
+            
+        Returns:
+            Result dictionary in the format documented on retrieve()
+        """
+        # FAISS returns scores sorted descending, so the results above threshold are a prefix
+        n = int(np.count_nonzero(scores >= threshold))
+        if n == 0:
+            return {"found": False}
+        
+        top_scores = scores[:n].tolist()
+        
+        # Apply score gap logic: if top result significantly outperforms, return only top
+        # This reduces noise when the top result is clearly the best match
+        if n >= 2 and top_scores[0] - top_scores[1] > score_gap_threshold:
+            n = 1
+        
+        # Build result chunks from the ID mapping
+        chunks = [
+            {
+                "text": self.id_to_chunk[faiss_id]['text'],
+                "score": score,
+                "metadata": self.id_to_chunk[faiss_id]['metadata']
+            }
+            for faiss_id, score in zip(indices[:n].tolist(), top_scores)
+        ]
+        
+        # Return results
+        return {
+            "found": True,
+            "chunks": chunks
+        }
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 3, threshold: float = 0.35, score_gap_threshold: float = 0.20) -> List[Dict[str, Any]]:
+        """
+        Retrieve relevant chunks for several queries with one encode and one FAISS search.
+        
+        Args:
+            queries: Query strings to search for
+            top_k: Number of top results to retrieve per query (default: 3)
+            threshold: Minimum similarity score threshold (default: 0.35)
+            score_gap_threshold: If gap between top and second result exceeds this,
+                               return only the top result (default: 0.20)
+            
+        Returns:
+            One result dictionary per query, in input order (see retrieve())
+        """
+        results: List[Dict[str, Any]] = [{"found": False} for _ in queries]
+        
+        # Validate queries: blank ones stay {"found": False} and are not searched
+        valid = [i for i, query in enumerate(queries) if query and query.strip()]
+        if not valid:
+            return results
+        
+        # Embed queries (cached for repeated queries)
+        query_matrix = self._embed_batch([queries[i] for i in valid])
+        
+        # Search FAISS index
+        # Returns: (scores, indices), each of shape (len(valid), k)
+        scores, indices = self.index.search(query_matrix, k=top_k)
+        
+        for row, i in enumerate(valid):
+            results[i] = self._build_result(scores[row], indices[row], threshold, score_gap_threshold)
+        return results
+    
     def retrieve(self, query: str, top_k: int = 3, threshold: float = 0.35, score_gap_threshold: float = 0.20) -> Dict[str, Any]:
         """
         Retrieve relevant chunks for a given query.
@@ -110,69 +284,14 @@ class Retriever:
             - Future enhancement: Metadata-based filtering could be added to filter results
               by topic/category tags for improved precision.
         """
-        # Validate query
-        if not query or not query.strip():
-            return {"found": False}
-        
-        # Embed query
-        query_embedding = self.model.encode(query, convert_to_numpy=True)
-        
-        # Normalize embedding (matches how chunks were embedded)
-        query_embedding = normalize_embedding(query_embedding)
-        
-        # Reshape to (1, dimension) for FAISS search
-        query_vector = query_embedding.reshape(1, -1).astype('float32')
-        
-        # Search FAISS index
-        # Returns: (scores, indices) where scores are similarity scores
-        scores, indices = self.index.search(query_vector, k=top_k)
-        
-        # Extract results (FAISS returns shape (1, k))
-        scores = scores[0]  # Shape: (k,)
-        indices = indices[0]  # Shape: (k,)
-        
-        # Check threshold: if highest score < threshold, return no results
-        if len(scores) == 0 or scores[0] < threshold:
-            return {"found": False}
-        
-        # Build result chunks
-        chunks = []
-        for i in range(len(scores)):
-            # Skip results below threshold
-            if scores[i] < threshold:
-                continue
-            
-            # Get FAISS vector ID
-            faiss_id = int(indices[i])
-            
-            # Lookup chunk from ID mapping
-            chunk_data = self.id_to_chunk[faiss_id]
-            
-            # Format result chunk
-            chunk_result = {
-                "text": chunk_data['text'],
-                "score": float(scores[i]),
-                "metadata": chunk_data['metadata']
-            }
-            chunks.append(chunk_result)
-        
-        # Apply score gap logic: if top result significantly outperforms, return only top
-        # This reduces noise when the top result is clearly the best match
-        if len(chunks) >= 2:
-            score_gap = chunks[0]['score'] - chunks[1]['score']
-            if score_gap > score_gap_threshold:
-                chunks = [chunks[0]]  # Return only top result
-        
-        # Return results
-        return {
-            "found": True,
-            "chunks": chunks
-        }
+        return self.retrieve_batch([query], top_k, threshold, score_gap_threshold)[0]
 
 
 def retrieve(query: str, embeddings_dir: Path = None) -> Dict[str, Any]:
     """
-    Convenience function for one-off retrieval without instantiating Retriever.
+    Convenience function for retrieval without managing a Retriever.
+    
+    The Retriever for each embeddings directory is created on first use and reused afterwards.
     
     Args:
         query: Query string to search for
@@ -181,6 +300,17 @@ def retrieve(query: str, embeddings_dir: Path = None) -> Dict[str, Any]:
     Returns:
         Dictionary with retrieval results
     """
-    retriever = Retriever(embeddings_dir=embeddings_dir)
+    # Validate query before paying for index/model initialization
+    if not query or not query.strip():
+        return {"found": False}
+    
+    key = Path(embeddings_dir).resolve() if embeddings_dir is not None else None
+    retriever = _RETRIEVERS.get(key)
+    if retriever is None:
+        with _RETRIEVERS_LOCK:
+            retriever = _RETRIEVERS.get(key)
+            if retriever is None:
+                retriever = Retriever(embeddings_dir=embeddings_dir)
+                _RETRIEVERS[key] = retriever
     return retriever.retrieve(query)
 
@@ -52,28 +52,23 @@ class NotificationService:
                 "tool_result": dict (if tool was called)
             }
         """
-        # Get current state
-        current_state = self.mcp_server.get_current_state()
-        
         # Detect potential issues (devices ON in other rooms)
         potential_issues = self.mcp_server.detect_potential_issues()
         
-        # If no potential issues, no need to notify
+        # If no potential issues, no need to notify (common case: skip building the state summary)
         if not potential_issues:
             return None
         
         # Filter out devices that are in notification_preferences (user said "keep it on")
-        notification_prefs = current_state.get("notification_preferences", [])
-        devices_to_notify = []
-        
-        for issue in potential_issues:
-            room = issue["room"]
-            device = issue["device"]
-            device_key = f"{room} {device}"
-            
-            # Check if this device is in notification preferences
-            if device_key not in notification_prefs:
-                devices_to_notify.append(issue)
+        # Preferences are "<room> <device>" strings, kept as a set by the state layer
+        notification_prefs = self.mcp_server.state_manager.get_notification_preference_keys()
+        if notification_prefs:
+            devices_to_notify = [
+                issue for issue in potential_issues
+                if f"{issue['room']} {issue['device']}" not in notification_prefs
+            ]
+        else:
+            devices_to_notify = potential_issues
         
         # If no devices need notification (all are in preferences), return None
         if not devices_to_notify:
@@ -81,6 +76,7 @@ class NotificationService:
             return None
         
         # Generate notification message
+        current_state = self.mcp_server.get_current_state()
         message = self._build_notification_message(devices_to_notify, current_state)
         
         # Execute notification via chat_message tool
@@ -121,20 +117,14 @@ class NotificationService:
         if not devices_to_notify:
             return ""
         
-        # Build list of device descriptions
-        device_descriptions = []
-        for issue in devices_to_notify:
-            room = issue["room"]
-            device = issue["device"]
-            device_descriptions.append(f"{room} {device}")
-        
         # Format message based on number of devices
-        if len(device_descriptions) == 1:
-            device_desc = device_descriptions[0]
-            message = f"I noticed the {device_desc} is still ON. Would you like me to turn it off?"
-        else:
-            devices_list = ", ".join(device_descriptions[:-1]) + f", and {device_descriptions[-1]}"
-            message = f"I noticed these devices are still ON: {devices_list}. Would you like me to turn them off?"
-        
-        return message
+        if len(devices_to_notify) == 1:
+            issue = devices_to_notify[0]
+            return f"I noticed the {issue['room']} {issue['device']} is still ON. Would you like me to turn it off?"
+        
+        device_descriptions = [f"{issue['room']} {issue['device']}" for issue in devices_to_notify]
+        return (
+            f"I noticed these devices are still ON: {', '.join(device_descriptions[:-1])}, "
+            f"and {device_descriptions[-1]}. Would you like me to turn them off?"
+        )
 
@@ -1,26 +1,42 @@
 """
 Minimal safety logging for MCP system.
 Console-only logging - no file I/O.
+
+Records go through the "mcp.safety" logger into a queue; a background
+listener thread stamps them with the time and does the actual stdout
+writes, so callers never block on I/O.
 """
 
-import datetime
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
+logger = logging.getLogger("mcp.safety")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_console_handler = logging.StreamHandler(sys.stdout)
+# asctime comes from the record's creation time, so it is exact even when the write is delayed
+_console_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+_listener = QueueListener(queue.Queue(-1), _console_handler)
+logger.addHandler(QueueHandler(_listener.queue))
+_listener.start()
+atexit.register(_listener.stop)
+
 
 class SafetyLogger:
     """
     Minimal logger for safety features.
-    Prints to console only.
+    Writes to console only (via the queued "mcp.safety" logger).
     """
     
     def __init__(self):
         """Initialize logger."""
         pass
     
-    def _format_timestamp(self) -> str:
-        """Get formatted timestamp."""
-        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     def log_tool_call(self, tool: str, arguments: dict, success: bool, result: Optional[dict] = None):
         """
         Log a tool call attempt.
@@ -31,15 +47,16 @@ class SafetyLogger:
             success: Whether the call succeeded
             result: Optional result dict
         """
-        timestamp = self._format_timestamp()
         status = "SUCCESS" if success else "FAILED"
         
-        print(f"[{timestamp}] TOOL_CALL: {tool} | Status: {status}")
-        print(f"  Arguments: {arguments}")
-        
+        # One record per call keeps the lines contiguous. The message is %-merged in this
+        # thread (QueueHandler.prepare); only the timestamp and the write happen in the listener
         if result and not success:
             error = result.get("error", "Unknown error")
-            print(f"  Error: {error}")
+            logger.info("TOOL_CALL: %s | Status: %s\n  Arguments: %s\n  Error: %s",
+                        tool, status, arguments, error)
+        else:
+            logger.info("TOOL_CALL: %s | Status: %s\n  Arguments: %s", tool, status, arguments)
     
     def log_rejected_action(self, reason: str, tool: str = None, arguments: dict = None):
         """
@@ -50,12 +67,17 @@ class SafetyLogger:
             tool: Optional tool name
             arguments: Optional tool arguments
         """
-        timestamp = self._format_timestamp()
-        print(f"[{timestamp}] REJECTED: {reason}")
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        fmt = "REJECTED: %s"
+        args = [reason]
         if tool:
-            print(f"  Tool: {tool}")
+            fmt += "\n  Tool: %s"
+            args.append(tool)
         if arguments:
-            print(f"  Arguments: {arguments}")
+            fmt += "\n  Arguments: %s"
+            args.append(arguments)
+        logger.info(fmt, *args)
     
     def log_reminder_prevented(self, item: str):
         """
@@ -64,8 +86,7 @@ class SafetyLogger:
         Args:
             item: Item that was prevented from being reminded
         """
-        timestamp = self._format_timestamp()
-        print(f"[{timestamp}] REMINDER_PREVENTED: '{item}' is in do_not_remind list")
+        logger.info("REMINDER_PREVENTED: '%s' is in do_not_remind list", item)
 
 
 # Global logger instance